@@ -6,8 +6,70 @@
 # -- -- -- -- -- -- -- -- -- -- -- -- --
 # This is a basic implementation of a 
 # Caesar cipher.
+# Run without arguments for the interactive
+# prompt, or pass -e/-d with a key to
+# stream stdin (or --in) to stdout (or --out):
+#   python3 a10_caesar_cipher.py -e 3 --in log.txt --out log.enc
+# Whole files or directories can be encrypted
+# across several processes with --batch:
+#   python3 a10_caesar_cipher.py -e 3 --batch archive/ --out-dir archive.enc
+# If the key is unknown, --crack guesses it
+# by frequency analysis:
+#   python3 a10_caesar_cipher.py --crack --in log.enc
+# Huge files can be encrypted in place with
+# --in-place, which can resume after a crash:
+#   python3 a10_caesar_cipher.py -e 3 --in-place huge.log
+# Other substitution ciphers can be picked
+# with --cipher when streaming:
+#   python3 a10_caesar_cipher.py --cipher vigenere -e lemon --in a.txt
 # -- -- -- -- -- -- -- -- -- -- -- -- --
 
+# Imports
+import os       # For walking directories and file sizes in batch mode.
+import sys      # For command-line arguments and the binary stdin/stdout.
+import time     # For timing each shard in batch mode.
+import math     # For math.exp() when computing crack confidences.
+import mmap     # For mapping files in in-place mode.
+import zlib     # For zlib.crc32() of in-place mode's checkpoints.
+import re       # For finding the runs of letters a Vigenere key moves over.
+import argparse # For parsing the streaming mode's arguments.
+from concurrent.futures import ProcessPoolExecutor # Runs batch shards in parallel.
+
+# NumPy is optional. It is used to build letter histograms faster
+# in crack mode, and to put Vigenere's letters back in place;
+# bytes.count() and a loop over the runs of letters are used
+# without it.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Constants
+CHUNK_SIZE = 4 * 1024 * 1024  # Bytes read per chunk in streaming mode. (4 MiB)
+SHARD_SIZE = 64 * 1024 * 1024 # Bytes per shard in batch mode. (64 MiB)
+INPLACE_WINDOW = 64 * 1024 * 1024 # Bytes transformed per window in in-place mode. (64 MiB)
+INPLACE_PIECE  = 1024 * 1024      # Bytes written per checkpoint in in-place mode. (1 MiB)
+CHECKPOINT_SUFFIX = ".ckpt"       # Appended to a file's path to get its in-place checkpoint path.
+CRACK_SAMPLE_SIZE = 4 * 1024 * 1024 # Bytes of a large input sampled in crack mode. (4 MiB)
+CRACK_WINDOWS     = 64              # Number of evenly spaced windows the sample is taken from.
+CRACK_SHARPNESS   = 3.0             # How strongly crack confidences favour a lower chi-squared per letter.
+# Relative frequency of each letter A-Z in English text.
+ENGLISH_FREQS = [
+    0.08167, 0.01492, 0.02782, 0.04253, 0.12702, 0.02228, 0.02015,
+    0.06094, 0.06966, 0.00153, 0.00772, 0.04025, 0.02406, 0.06749,
+    0.07507, 0.01929, 0.00095, 0.05987, 0.06327, 0.09056, 0.02758,
+    0.00978, 0.02360, 0.00150, 0.01974, 0.00074
+]
+
+CIPHERS = ["caesar", "rot13", "rot47", "affine", "atbash", "vigenere"] # Ciphers the engine can compile.
+LETTER_RUNS = re.compile(rb"[A-Za-z]+") # Runs of ASCII letters.
+NON_LETTERS = bytes(b for b in range(256) if not (0x41 <= b <= 0x5A or 0x61 <= b <= 0x7A)) # Bytes that aren't ASCII letters.
+LETTER_MASK = bytes(int(b not in NON_LETTERS) for b in range(256)) # 1 for each ASCII letter byte, 0 otherwise.
+
+# Global variables.
+caesar_tables = {} # Compiled byte translation tables, keyed by (key % 26).
+cipher_cache  = {} # Compiled table sets, keyed by (cipher, key, decrypting).
+
 # Encrypt the provided string by shifting
 # all letters by the offset/key parameter.
 def caesar_encrypt(data, key):
@@ -39,35 +101,585 @@ def caesar_encrypt(data, key):
 def caesar_decrypt(data, key):
     return caesar_encrypt(data, -key)
 
-print("-- -- Caesar Cipher -- --")
+# Get the 256-entry byte translation table for a key.
+# Each table is built once by running every byte value
+# through the same shift as caesar_encrypt, so bytes.translate
+# gives identical output. Bytes above 0x7F are left alone,
+# which keeps UTF-8 text intact.
+# * key -> The signed integer key to shift by.
+def caesar_table(key):
+    key %= 26
+    table = caesar_tables.get(key)
+    if table is None:
+        table = bytes(
+            ord(caesar_encrypt(chr(i), key)) if i < 0x80 else i
+            for i in range(256))
+        caesar_tables[key] = table
+    return table
+
+# Build a byte translation table that maps each letter's
+# alphabet position (0-25) through a function, keeping case.
+# Every other byte is left alone.
+# * func -> A function mapping a position 0-25 to another.
+def letter_table(func):
+    table = bytearray(range(256))
+    for i in range(26):
+        table[0x41 + i] = 0x41 + func(i) % 26
+        table[0x61 + i] = 0x61 + func(i) % 26
+    return bytes(table)
+
+# Invert a byte translation table, to turn an
+# encryption table into its decryption table.
+# * table -> A 256-entry table which maps bytes one-to-one.
+def invert_table(table):
+    inverse = bytearray(256)
+    for i in range(256):
+        inverse[table[i]] = i
+    return bytes(inverse)
+
+# Compile a cipher into its list of byte translation tables.
+# Most ciphers have a single table. Vigenere has one table per
+# letter of its key, and cycles through them on letters only,
+# like the standard cipher: other bytes pass through without
+# using up a letter of the key.
+# Table sets are cached, so calling this again with the same
+# arguments costs a dictionary lookup.
+# * cipher     -> The name of the cipher, one of CIPHERS.
+# * key        -> The key: an integer for caesar, an (a, b) pair
+#                 for affine, a word for vigenere, and None for
+#                 rot13, rot47 and atbash.
+# * decrypting -> True to get the tables which undo the cipher.
+def cipher_compile(cipher, key=None, decrypting=False):
+    cache_key = (cipher, key, decrypting)
+    tables = cipher_cache.get(cache_key)
+    if tables is not None:
+        return tables
+
+    if cipher == "caesar":
+        tables = [caesar_table(key)]
+    elif cipher == "rot13":
+        tables = [caesar_table(13)]
+    elif cipher == "rot47":
+        # ROT47 rotates all 94 printable ASCII characters from '!' to '~'.
+        table = bytearray(range(256))
+        for i in range(0x21, 0x7F):
+            table[i] = 0x21 + (i - 0x21 + 47) % 94
+        tables = [bytes(table)]
+    elif cipher == "atbash":
+        tables = [letter_table(lambda i: 25 - i)]
+    elif cipher == "affine":
+        a, b = key
+        if math.gcd(a, 26) != 1:
+            raise ValueError("affine key 'a' must be coprime with 26, got {}".format(a))
+        tables = [letter_table(lambda i: a * i + b)]
+    elif cipher == "vigenere":
+        if not key or not key.isalpha() or not key.isascii():
+            raise ValueError("vigenere key must be a word of ASCII letters, got '{}'".format(key))
+        tables = [caesar_table((ord(c) & 0x1F) - 1) for c in key.lower()]
+    else:
+        raise ValueError("unknown cipher '{}'".format(cipher))
+
+    if decrypting:
+        tables = [invert_table(table) for table in tables]
+    tables = tuple(tables)
+    cipher_cache[cache_key] = tables
+    return tables
+
+# Count the ASCII letters in a chunk of bytes.
+# * chunk -> A bytes-like object.
+def letter_count(chunk):
+    return len(bytes(chunk).translate(None, NON_LETTERS))
+
+# Apply a set of tables to a chunk of bytes. This is the loop
+# every cipher shares. With several tables, the letters are
+# pulled out of the chunk, table j is applied to every period'th
+# letter starting from j (where 'phase' is the position of the
+# chunk's first letter in the key), and the letters are put back
+# at their positions. (With NumPy, in one scatter; without it,
+# one run of letters at a time.)
+# * chunk  -> A bytes-like object to translate.
+# * tables -> The tables from cipher_compile.
+# * phase  -> The index of the table for the first letter.
+def cipher_apply(chunk, tables, phase=0):
+    period = len(tables)
+    if period == 1:
+        return bytes(chunk).translate(tables[0])
+    chunk = bytes(chunk)
+    letters = chunk.translate(None, NON_LETTERS)
+    shifted = bytearray(len(letters))
+    for j in range(period):
+        shifted[j::period] = letters[j::period].translate(tables[(phase + j) % period])
+    if numpy is not None:
+        output = bytearray(chunk)
+        buf = numpy.frombuffer(output, dtype=numpy.uint8)
+        buf[numpy.flatnonzero(numpy.frombuffer(LETTER_MASK, dtype=bool)[buf])] = numpy.frombuffer(shifted, dtype=numpy.uint8)
+        return bytes(output)
+    pieces = []
+    pos = 0
+    used = 0
+    for run in LETTER_RUNS.finditer(chunk):
+        start, end = run.span()
+        pieces.append(chunk[pos:start])
+        pieces.append(shifted[used:used + end - start])
+        used += end - start
+        pos = end
+    pieces.append(chunk[pos:])
+    return b"".join(pieces)
+
+# Encrypt or decrypt data with any cipher. A str is worked on
+# as UTF-8 and a str is returned; bytes, bytearray and memoryview
+# objects give bytes back.
+# * data       -> The str or bytes-like object to encrypt.
+# * cipher     -> The name of the cipher, one of CIPHERS.
+# * key        -> The cipher's key. (See cipher_compile)
+# * decrypting -> True to decrypt instead.
+def cipher_transform(data, cipher, key=None, decrypting=False):
+    tables = cipher_compile(cipher, key, decrypting)
+    if isinstance(data, str):
+        return cipher_apply(data.encode("utf-8"), tables).decode("utf-8")
+    return cipher_apply(data, tables)
+
+# Encrypt data with any cipher. (See cipher_transform)
+def cipher_encrypt(data, cipher, key=None):
+    return cipher_transform(data, cipher, key, False)
+
+# Decrypt data with any cipher. (See cipher_transform)
+def cipher_decrypt(data, cipher, key=None):
+    return cipher_transform(data, cipher, key, True)
+
+# Encrypt a binary stream into another, one chunk at a time.
+# Memory use stays at about one chunk, whatever the input size.
+# Returns the number of bytes written.
+# * src        -> A binary file object to read from.
+# * dst        -> A binary file object to write to.
+# * tables     -> The tables from cipher_compile.
+# * chunk_size -> Number of bytes read per chunk.
+def cipher_stream(src, dst, tables, chunk_size=CHUNK_SIZE):
+    total = 0
+    phase = 0
+    while True:
+        chunk = src.read(chunk_size)
+        if not chunk:
+            break
+        dst.write(cipher_apply(chunk, tables, phase))
+        if len(tables) > 1:
+            phase = (phase + letter_count(chunk)) % len(tables)
+        total += len(chunk)
+    dst.flush()
+    return total
+
+# Caesar-encrypt a binary stream into another. (See cipher_stream)
+# * key -> The signed integer key. (Negate it to decrypt.)
+def caesar_stream(src, dst, key, chunk_size=CHUNK_SIZE):
+    return cipher_stream(src, dst, (caesar_table(key),), chunk_size)
+
+# Encrypt the byte range [start, end) of one file into the same
+# range of the output file. The cipher has no state between
+# characters, so every shard can be done on its own, in any order.
+# Returns (src_path, start, end, seconds taken).
+# * src_path -> The file to read from.
+# * dst_path -> The file to write to. It must already exist.
+# * start    -> Offset of the first byte of the shard.
+# * end      -> Offset just past the last byte of the shard.
+# * key      -> The signed integer key. (Negate it to decrypt.)
+def caesar_shard(src_path, dst_path, start, end, key):
+    time_start = time.perf_counter()
+    table = caesar_table(key)
+    with open(src_path, "rb") as src, open(dst_path, "r+b") as dst:
+        src.seek(start)
+        dst.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = src.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            dst.write(chunk.translate(table))
+            remaining -= len(chunk)
+    return (src_path, start, end, time.perf_counter() - time_start)
+
+# Find every file to encrypt in batch mode.
+# Returns a list of (src_path, dst_path) pairs. Directories
+# are walked, and their layout is kept under out_dir.
+# * paths   -> A list of file and directory paths.
+# * out_dir -> The directory to write the output files into.
+def batch_files(paths, out_dir):
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append((path, os.path.join(out_dir, os.path.basename(path))))
+            continue
+        for dir_path, dir_names, file_names in os.walk(path):
+            dir_names.sort()
+            for name in sorted(file_names):
+                src_path = os.path.join(dir_path, name)
+                files.append((src_path, os.path.join(out_dir, os.path.relpath(src_path, path))))
+    return files
+
+# Check that a batch won't overwrite its own input, or write two
+# files to the same place. Raises ValueError if it would.
+# * files -> The (src_path, dst_path) pairs from batch_files().
+def batch_check(files):
+    # Sources are compared by path and by inode, to catch hard links.
+    sources = set(os.path.realpath(src_path) for src_path, dst_path in files)
+    source_inodes = set((st.st_dev, st.st_ino) for st in (os.stat(src_path) for src_path, dst_path in files))
+    dests = {}
+    for src_path, dst_path in files:
+        dst_real = os.path.realpath(dst_path)
+        dst_stat = os.stat(dst_path) if os.path.exists(dst_path) else None
+        if dst_real in sources or (dst_stat is not None and (dst_stat.st_dev, dst_stat.st_ino) in source_inodes):
+            raise ValueError("'{}' (from '{}') would overwrite an input file".format(dst_path, src_path))
+        if dst_real in dests:
+            raise ValueError("'{}' and '{}' would both be written to '{}'".format(dests[dst_real], src_path, dst_path))
+        dests[dst_real] = src_path
+
+# Encrypt many files across a pool of worker processes.
+# Large files are split into byte-range shards, and each shard
+# writes straight into its own range of the output file, so
+# no reassembly step is needed.
+# Returns the (src_path, start, end, seconds) of every shard, in order.
+# Raises ValueError (before writing anything) if an output would
+# overwrite an input, or two outputs have the same path.
+# * paths      -> A list of file and directory paths.
+# * out_dir    -> The directory to write the output files into.
+# * key        -> The signed integer key. (Negate it to decrypt.)
+# * jobs       -> Number of worker processes. (None for one per CPU)
+# * shard_size -> Maximum number of bytes per shard.
+def caesar_batch(paths, out_dir, key, jobs=None, shard_size=SHARD_SIZE):
+    files = batch_files(paths, out_dir)
+    batch_check(files)
+
+    # Create every output file at its final size first,
+    # so the shards can write into it in any order.
+    shards = []
+    for src_path, dst_path in files:
+        size = os.path.getsize(src_path)
+        os.makedirs(os.path.dirname(dst_path) or ".", exist_ok=True)
+        with open(dst_path, "wb") as dst:
+            dst.truncate(size)
+        for start in range(0, size, shard_size):
+            shards.append((src_path, dst_path, start, min(start + shard_size, size)))
+
+    with ProcessPoolExecutor(jobs) as pool:
+        futures = [pool.submit(caesar_shard, *shard, key) for shard in shards]
+        return [future.result() for future in futures]
+
+# Read an in-place checkpoint file.
+# Returns ([key, done, piece_end, crc_before, crc_after], data),
+# where 'data' is the piece's bytes before it was written, or
+# None if there is no checkpoint.
+# * ckpt_path -> The path of the checkpoint file.
+def checkpoint_read(ckpt_path):
+    try:
+        with open(ckpt_path, "rb") as ckpt_file:
+            line, sep, data = ckpt_file.read().partition(b"\n")
+    except FileNotFoundError:
+        return None
+    return [int(v) for v in line.split()], data
+
+# Atomically and durably replace an in-place checkpoint file.
+# The new file is synced before it replaces the old one, and
+# its directory after, so once this returns the checkpoint
+# survives a crash.
+# * ckpt_path -> The path of the checkpoint file.
+# * values    -> The integers to write.
+# * data      -> The bytes of the piece, before it is written.
+def checkpoint_write(ckpt_path, values, data):
+    tmp_path = ckpt_path + ".tmp"
+    with open(tmp_path, "wb") as ckpt_file:
+        ckpt_file.write(" ".join(str(v) for v in values).encode("ascii") + b"\n")
+        ckpt_file.write(data)
+        ckpt_file.flush()
+        os.fsync(ckpt_file.fileno())
+    os.replace(tmp_path, ckpt_path)
+    if hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(os.path.dirname(os.path.abspath(ckpt_path)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+# Encrypt a file in place by memory-mapping it and translating
+# one window at a time. Only one window is ever copied, and no
+# second file is written.
+# Each window is written in pieces. Before a piece is written, a
+# checkpoint records where it is, the CRC of its bytes before and
+# after, and a copy of its bytes before, and is synced to disk.
+# A run that is killed can then resume without shifting any piece
+# twice, and a piece that was only partly written is written again
+# from the copy. The checkpoint is removed once the whole file is done.
+# Returns the number of bytes transformed by this run.
+# * path      -> The path of the file to encrypt.
+# * key       -> The signed integer key. (Negate it to decrypt.)
+# * window    -> Bytes per window. Rounded to the mmap granularity.
+# * progress  -> Optional function called after every window with
+#                (bytes done, total bytes, bytes per second).
+# * piece     -> Bytes per checkpointed piece of a window. Rounded
+#                like 'window'.
+def caesar_inplace(path, key, window=INPLACE_WINDOW, progress=None, piece=INPLACE_PIECE):
+    table = caesar_table(key)
+    window = max(mmap.ALLOCATIONGRANULARITY, window - window % mmap.ALLOCATIONGRANULARITY)
+    piece = min(piece, window)
+    piece = max(mmap.ALLOCATIONGRANULARITY, piece - piece % mmap.ALLOCATIONGRANULARITY)
+    ckpt_path = path + CHECKPOINT_SUFFIX
+    size = os.path.getsize(path)
+
+    # Work out where to start. A piece that was being written when
+    # the last run stopped is skipped if its CRC shows it finished,
+    # and written again from the checkpoint's copy if not.
+    start = 0
+    ckpt = checkpoint_read(ckpt_path)
+
+    with open(path, "r+b") as f:
+        if size == 0:
+            return 0
+        mm = mmap.mmap(f.fileno(), 0)
+        try:
+            if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
 
-# Ask user for mode.
-inp = input("Type 'e' for encryption, 'd' for decryption.\n")
-while len(inp) < 1 or not (inp == "e" or inp == "d"):
-    inp = input("Invalid input. (e)ncrypt or (d)ecrypt?\n");
+            if ckpt is not None:
+                (ckpt_key, start, end, crc_before, crc_after), saved = ckpt
+                if ckpt_key != key % 26:
+                    raise ValueError("checkpoint '{}' was made with key {}".format(ckpt_path, ckpt_key))
+                if len(saved) != end - start or zlib.crc32(saved) != crc_before:
+                    raise ValueError("checkpoint '{}' is corrupt".format(ckpt_path))
+                if zlib.crc32(mm[start:end]) != crc_after:
+                    mm[start:end] = saved.translate(table)
+                    mm.flush(start, end - start)
+                start = end
 
-# Ask client for data
-encrypting = inp == "e"
-action = "encrypt" if encrypting else "decrypt"
-data = input("Enter the data you wish to " + action + ".\n")
-while len(data) < 1:
-    data = input("Please provide a string to " + action + "\n")
+            time_start = time.perf_counter()
+            offset = start
+            while offset < size:
+                end = min(offset + window, size)
+                for piece_start in range(offset, end, piece):
+                    piece_end = min(piece_start + piece, end)
+                    before = mm[piece_start:piece_end]
+                    after = before.translate(table)
+                    checkpoint_write(ckpt_path, [key % 26, piece_start, piece_end, zlib.crc32(before), zlib.crc32(after)], before)
+                    mm[piece_start:piece_end] = after
+                    mm.flush(piece_start, piece_end - piece_start)
+                offset = end
+                if progress is not None:
+                    secs = time.perf_counter() - time_start
+                    progress(offset, size, (offset - start) / secs if secs > 0 else 0.0)
+        finally:
+            mm.close()
 
-# Ask for key. Loop until valid input.
-while True:
+    os.remove(ckpt_path)
+    return size - start
+
+# Count each letter in a buffer, ignoring case.
+# Returns a list of 26 counts, for A-Z.
+# * data -> A bytes-like object to count the letters of.
+def letter_histogram(data):
+    if numpy is not None:
+        counts = numpy.bincount(numpy.frombuffer(data, dtype=numpy.uint8), minlength=256)
+        return (counts[0x41:0x41 + 26] + counts[0x61:0x61 + 26]).tolist()
+    data = bytes(data)
+    return [data.count(0x41 + i) + data.count(0x61 + i) for i in range(26)]
+
+# Read a sample of a binary file for crack mode.
+# Seekable files are sampled from evenly spaced windows, so
+# only sample_size bytes are read however large the file is.
+# Streams that can't seek (such as stdin) use their first bytes.
+# * src         -> A binary file object to read from.
+# * sample_size -> The maximum number of bytes to read.
+# * windows     -> The number of windows to spread the sample over.
+def read_sample(src, sample_size=CRACK_SAMPLE_SIZE, windows=CRACK_WINDOWS):
     try:
-        key = int(input("Enter the cipher key. (must be signed integer)" + ".\n"))
-    except:
-        print("Invalid key provided. Must be a signed integer.\n")
-        continue
-    break
-
-# Change process based on mode selected.
-if encrypting:
-    # Encrypt the string.
-    print("Encrypted with key offset of", key)
-    print("Encrypted string: ", caesar_encrypt(data, key))
-else:
-    # Decrypt the string.
-    print("Decrypted with key offset of", key)
-    print("Decrypted string: ", caesar_decrypt(data, key))
\ No newline at end of file
+        size = os.fstat(src.fileno()).st_size if src.seekable() else -1
+    except (OSError, AttributeError):
+        size = -1
+    if size <= sample_size:
+        return src.read(sample_size)
+
+    window_size = sample_size // windows
+    step = size // windows
+    sample = bytearray()
+    for i in range(windows):
+        src.seek(i * step)
+        sample += src.read(window_size)
+    return bytes(sample)
+
+# Guess the key of Caesar-encrypted data by frequency analysis.
+# Every one of the 26 shifts is undone on the letter histogram,
+# and scored against English with a chi-squared test.
+# Returns the 'top' best (key, confidence) pairs, best first.
+# The key can be passed straight to caesar_decrypt.
+# * data -> A bytes-like object of the encrypted data.
+# * top  -> The number of keys to return.
+def caesar_crack(data, top=3):
+    hist = letter_histogram(data)
+    total = sum(hist)
+    if total == 0:
+        return [(key, 1.0 / 26) for key in range(top)]
+
+    # Decrypting with key k maps cipher letter (i + k) back to i,
+    # the reverse of the shift in caesar_encrypt.
+    scores = []
+    for key in range(26):
+        chi = 0.0
+        for i in range(26):
+            expected = ENGLISH_FREQS[i] * total
+            observed = hist[(i + key) % 26]
+            chi += (observed - expected) ** 2 / expected
+        scores.append((chi, key))
+    scores.sort()
+
+    # Turn the scores into weights, exp(-sharpness * chi / total),
+    # so the confidences of all 26 keys add up to one. Chi-squared
+    # grows with the number of letters even when no key fits (as
+    # for random data), so it is taken per letter, and then only
+    # a key that fits much better than the others stands out.
+    best = scores[0][0]
+    weights = [math.exp(CRACK_SHARPNESS * (best - chi) / total) for chi, key in scores]
+    weight_sum = sum(weights)
+    return [(key, weights[i] / weight_sum) for i, (chi, key) in enumerate(scores[:top])]
+
+# Non-interactive mode. Streams the input file (or stdin)
+# through the cipher into the output file (or stdout),
+# encrypts a batch of files in parallel or in place,
+# or cracks the key.
+# * args -> The command-line arguments passed into the program.
+def stream_main(args):
+    parser = argparse.ArgumentParser(description="Caesar cipher streaming mode.")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("-e", "--encrypt", nargs="?", const="", metavar="KEY", help="encrypt with KEY")
+    mode.add_argument("-d", "--decrypt", nargs="?", const="", metavar="KEY", help="decrypt with KEY")
+    mode.add_argument("--crack", action="store_true", help="guess the key of the input by frequency analysis")
+    parser.add_argument("--cipher", choices=CIPHERS, default="caesar", help="cipher to stream with (default: caesar)."
+                        " KEY is a signed integer for caesar, 'a,b' for affine, a word for vigenere, and unused otherwise")
+    parser.add_argument("--in", dest="in_path", metavar="PATH", help="file to read (default: stdin)")
+    parser.add_argument("--out", dest="out_path", metavar="PATH", help="file to write (default: stdout)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, metavar="BYTES", help="bytes read per chunk")
+    parser.add_argument("--batch", nargs="+", metavar="PATH", help="files or directories to encrypt in parallel")
+    parser.add_argument("--out-dir", metavar="DIR", help="directory for the --batch output files")
+    parser.add_argument("--jobs", type=int, metavar="N", help="worker processes for --batch (default: one per CPU)")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE, metavar="BYTES", help="bytes per --batch shard")
+    parser.add_argument("--in-place", metavar="PATH", help="encrypt PATH in place, resuming from its checkpoint")
+    parser.add_argument("--window", type=int, default=INPLACE_WINDOW, metavar="BYTES", help="bytes per --in-place window")
+    parser.add_argument("--top", type=int, default=3, metavar="N", help="number of keys --crack prints")
+    parser.add_argument("--sample-size", type=int, default=CRACK_SAMPLE_SIZE, metavar="BYTES", help="bytes --crack samples")
+    opts = parser.parse_args(args[1:])
+    for name in ("chunk_size", "shard_size", "window"):
+        if getattr(opts, name) < 1:
+            parser.error("--{} must be positive, got {}".format(name.replace("_", "-"), getattr(opts, name)))
+    if opts.jobs is not None and opts.jobs < 1:
+        parser.error("--jobs must be at least 1, got {}".format(opts.jobs))
+
+    # Crack mode. Print the best keys and their confidences.
+    if opts.crack:
+        src = open(opts.in_path, "rb") if opts.in_path else sys.stdin.buffer
+        try:
+            sample = read_sample(src, opts.sample_size)
+        finally:
+            if opts.in_path:
+                src.close()
+        for key, confidence in caesar_crack(sample, opts.top):
+            print("{}\t{:.4f}".format(key, confidence))
+        return
+
+    decrypting = opts.encrypt is None
+    key_str = opts.decrypt if decrypting else opts.encrypt
+
+    # Parse the key. Every cipher except caesar can only be streamed.
+    if opts.cipher == "caesar":
+        try:
+            key = int(key_str)
+        except ValueError:
+            parser.error("caesar key must be a signed integer, got '{}'".format(key_str))
+        if decrypting:
+            key = -key
+        tables = (caesar_table(key),)
+    else:
+        if opts.in_place or opts.batch:
+            parser.error("--in-place and --batch only support the caesar cipher")
+        try:
+            if opts.cipher == "affine":
+                key = tuple(int(v) for v in key_str.split(","))
+                if len(key) != 2:
+                    raise ValueError("affine key must be 'a,b', got '{}'".format(key_str))
+            else:
+                key = key_str or None
+            tables = cipher_compile(opts.cipher, key, decrypting)
+        except ValueError as e:
+            parser.error(str(e))
+
+    # In-place mode. Print the progress to stderr.
+    if opts.in_place:
+        def print_progress(done, total, rate):
+            print("{:,}/{:,} bytes ({:.1f}%) {:.1f} MB/s".format(done, total, 100.0 * done / total, rate / 1e6), file=sys.stderr)
+        caesar_inplace(opts.in_place, key, opts.window, print_progress)
+        return
+
+    # Batch mode. Print the timing of each shard to stderr.
+    if opts.batch:
+        if not opts.out_dir:
+            parser.error("--batch needs --out-dir")
+        try:
+            batch_check(batch_files(opts.batch, opts.out_dir))
+        except ValueError as e:
+            parser.error(str(e))
+        for src_path, start, end, secs in caesar_batch(opts.batch, opts.out_dir, key, opts.jobs, opts.shard_size):
+            rate = (end - start) / secs / 1e6 if secs > 0 else 0.0
+            print("{} [{:,}-{:,}) {:.3f}s ({:.1f} MB/s)".format(src_path, start, end, secs, rate), file=sys.stderr)
+        return
+
+    src = open(opts.in_path, "rb") if opts.in_path else sys.stdin.buffer
+    dst = open(opts.out_path, "wb") if opts.out_path else sys.stdout.buffer
+    try:
+        cipher_stream(src, dst, tables, opts.chunk_size)
+    finally:
+        if opts.in_path:
+            src.close()
+        if opts.out_path:
+            dst.close()
+
+# The interactive prompt mode.
+def interactive_main():
+    print("-- -- Caesar Cipher -- --")
+
+    # Ask user for mode.
+    inp = input("Type 'e' for encryption, 'd' for decryption.\n")
+    while len(inp) < 1 or not (inp == "e" or inp == "d"):
+        inp = input("Invalid input. (e)ncrypt or (d)ecrypt?\n");
+
+    # Ask client for data
+    encrypting = inp == "e"
+    action = "encrypt" if encrypting else "decrypt"
+    data = input("Enter the data you wish to " + action + ".\n")
+    while len(data) < 1:
+        data = input("Please provide a string to " + action + "\n")
+
+    # Ask for key. Loop until valid input.
+    while True:
+        try:
+            key = int(input("Enter the cipher key. (must be signed integer)" + ".\n"))
+        except:
+            print("Invalid key provided. Must be a signed integer.\n")
+            continue
+        break
+
+    # Change process based on mode selected.
+    if encrypting:
+        # Encrypt the string.
+        print("Encrypted with key offset of", key)
+        print("Encrypted string: ", caesar_encrypt(data, key))
+    else:
+        # Decrypt the string.
+        print("Decrypted with key offset of", key)
+        print("Decrypted string: ", caesar_decrypt(data, key))
+
+# The main method. Streams when given arguments,
+# otherwise runs the interactive prompt.
+# * args -> The command-line arguments passed into the program.
+def main_func(args):
+    if len(args) > 1:
+        stream_main(args)
+    else:
+        interactive_main()
+
+# Call the main method
+if __name__ == "__main__":
+    main_func(sys.argv)
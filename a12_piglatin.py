@@ -13,8 +13,34 @@
 # becomes 
 # “Hetay uickqay rownbay oxfay”.
 # -- -- -- -- -- -- -- -- -- -- -- -- --
+# Pass --decode to translate Pig Latin back,
+# optionally with a word list to settle
+# ambiguous words:
+#   python3 a12_piglatin.py --decode --wordlist words.txt
+# Files or piped input are translated as a
+# stream, a chunk at a time:
+#   python3 a12_piglatin.py --in book.txt --out book.pig
+# -- -- -- -- -- -- -- -- -- -- -- -- --
+
+# Imports
+import io        # For UTF-8 text wrappers around stdin and stdout.
+import re        # For splitting text into words in the fast translator.
+import sys       # For command-line arguments.
+import random    # For random corpora in the differential check.
+import argparse  # For parsing the command-line arguments.
+import functools # For functools.lru_cache of translated words.
 
 ALPHABET = "abcdefghijklmnopqrstuvwxyz0123456789"
+# Splits text on runs of non-word characters, keeping the runs.
+# Word characters are those whose .lower() is in ALPHABET. The
+# Kelvin sign (U+212A) is the only one outside ASCII; it lowers to 'k'.
+WORD_SPLIT = re.compile("([^0-9A-Za-z\u212a]+)")
+WORD_CHARS = frozenset("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz\u212a")
+WORD_CACHE_SIZE = 65536 # Number of translated words kept by the fast translator.
+CHUNK_SIZE = 1024 * 1024 # Characters read per chunk when streaming.
+ROUND_TRIP_TEXTS = ( # Texts the decoder must give back as they were. (See check_round_trip)
+    "Hello, world!", "Am I?", "Take a.", "Is it a?", "I?", "Hello, a", "Hi  a", "a h!"
+)
 
 # Translates an English string of text to
 # 'Pig Latin'.
@@ -81,5 +107,368 @@ def string_to_piglatin(data):
     # Return the translated string.
     return output
 
-while True:
-    print("Translates to: " + string_to_piglatin(input("Enter the text you wish to translate into Pig Latin:\n")))
\ No newline at end of file
+# Translate a single word to Pig Latin, with the same case
+# rules as string_to_piglatin. This is the uncached version;
+# translators call word_to_piglatin, which caches it.
+# * word -> The word to translate.
+def translate_word(word):
+    word_len = len(word)
+    if word_len == 0:
+        return ""
+    if word_len == 1:
+        return word + ("AY" if word.isupper() else "ay")
+
+    # The new beginning character's case changes based on the old one.
+    char_beg_final = word[1].upper() if word[0].isupper() else word[1].lower()
+
+    # The new ending character's case depends on the previous letter's.
+    if word[-1].isupper():
+        char_end_final = word[0].upper() + "AY"
+    else:
+        char_end_final = word[0].lower() + "ay"
+    return char_beg_final + word[2:] + char_end_final
+
+# The cached translate_word. Natural text is made of a few thousand
+# distinct words, so the cache keeps the most recently used ones,
+# and the forward translator, the streaming translator and the
+# decoder's checks all share it. (See set_word_cache_size)
+word_to_piglatin = functools.lru_cache(maxsize=WORD_CACHE_SIZE)(translate_word)
+
+# Translates an English string of text to 'Pig Latin', giving
+# exactly what string_to_piglatin gives, in linear time.
+# The text is split into words and runs of separators with one
+# regular expression, each word is translated through the cache,
+# and the pieces are joined once at the end. Like
+# string_to_piglatin, separators come out lowercased, and the
+# last character always ends the last word, even if it is not
+# a letter. (ASCII separators have no case, so they are only
+# lowercased when the text has non-ASCII characters.)
+# * data  -> The text to translate.
+# * final -> Whether 'data' ends the text. Pass False for all
+#            but the last piece when translating in pieces; those
+#            pieces must end with a separator.
+def string_to_piglatin_fast(data, final=True):
+    if not data:
+        return ""
+    if final:
+        pieces = WORD_SPLIT.split(data[:-1])
+        pieces[-1] += data[-1]
+    else:
+        pieces = WORD_SPLIT.split(data)
+    pieces[0::2] = map(word_to_piglatin, pieces[0::2])
+    if not data.isascii():
+        pieces[1::2] = map(separator_lower, pieces[1::2])
+    return "".join(pieces)
+
+# Lowercase a run of separators one character at a time, the way
+# string_to_piglatin does. This only differs from str.lower() for
+# a capital sigma, which str.lower() turns into a final sigma
+# at the end of a word.
+# * sep -> The run of separator characters.
+def separator_lower(sep):
+    if "\u03a3" in sep:
+        return "".join(map(str.lower, sep))
+    return sep.lower()
+
+# Check that string_to_piglatin_fast matches string_to_piglatin,
+# on random text mixing words, digits, punctuation, whitespace
+# and a few non-ASCII characters.
+# Returns the number of mismatching texts.
+# * count -> The number of random texts to try.
+# * seed  -> The random seed, so a failure can be repeated.
+def check_fast_translator(count, seed=0):
+    rng = random.Random(seed)
+    chars = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789" * 4 + " .,!?'-\n\t" * 3 + "éÉßİΑΣ\u212a"
+    failures = 0
+    for i in range(count):
+        data = "".join(rng.choice(chars) for j in range(rng.randrange(0, 200)))
+        if string_to_piglatin_fast(data) != string_to_piglatin(data):
+            failures += 1
+            print("Mismatch for: " + repr(data))
+    return failures
+
+# Check that piglatin_to_string gives back each of the
+# ROUND_TRIP_TEXTS after string_to_piglatin_fast, without a
+# word list. These are the endings where the last word could
+# have swallowed a trailing separator.
+# Returns the number of texts that did not come back.
+def check_round_trip():
+    failures = 0
+    for data in ROUND_TRIP_TEXTS:
+        decoded = piglatin_to_string(string_to_piglatin_fast(data))
+        if decoded != data:
+            failures += 1
+            print("Round trip failed for: " + repr(data) + " (got " + repr(decoded) + ")")
+    return failures
+
+# Load a newline-separated word list into a set, for the
+# decoder to check words against. Each file is only read once.
+# * path -> The path of the word list.
+@functools.lru_cache(maxsize=None)
+def load_wordlist(path):
+    with open(path, "rt", encoding="utf-8", errors="replace") as f:
+        return frozenset(line.strip() for line in f if line.strip())
+
+# Check whether a decoded word is in the word list, in either
+# its own case or lowercase.
+# * word     -> The decoded word.
+# * wordlist -> A set of words.
+def in_wordlist(word, wordlist):
+    return word in wordlist or word.lower() in wordlist
+
+# Translate a single Pig Latin word back to English.
+# The moved first letter goes back to the front, and the case
+# of each letter is undone where the forward rules allow:
+# the first letter takes the case of the new first letter, and
+# the second letter (whose case was overwritten) is guessed from
+# the rest of the word. If a word list is given, and exactly one
+# case of the second letter is in it, that one is used.
+# Anything that string_to_piglatin could not have produced is
+# returned unchanged. Translators call piglatin_to_word, which
+# caches this.
+# * word     -> The Pig Latin word.
+# * wordlist -> An optional set of words, from load_wordlist.
+def decode_word(word, wordlist=None):
+    if len(word) < 3 or word[-2:] not in ("ay", "AY"):
+        return word
+    core = word[:-2]
+    if len(core) == 1:
+        return core if word_to_piglatin(core) == word else word
+
+    # core is (second letter) + (rest) + (first letter).
+    first = core[-1].upper() if core[0].isupper() else core[-1].lower()
+    rest = core[1:-1]
+    upper = word[-2:] == "AY" if len(core) == 2 else rest.isupper()
+    candidates = [first + (core[0].upper() if upper else core[0].lower()) + rest]
+    candidates.append(first + (core[0].lower() if upper else core[0].upper()) + rest)
+
+    if wordlist is not None:
+        found = [c for c in candidates if c in wordlist]
+        if len(found) == 1:
+            candidates.insert(0, found[0])
+    for candidate in candidates:
+        if word_to_piglatin(candidate) == word:
+            return candidate
+    return word
+
+# The cached decode_word. (See set_word_cache_size)
+piglatin_to_word = functools.lru_cache(maxsize=WORD_CACHE_SIZE)(decode_word)
+
+# Change how many words the translation caches keep. The least
+# recently used words are dropped first. This empties the caches.
+# * size -> The number of words each cache keeps. (0 turns caching off)
+def set_word_cache_size(size):
+    global word_to_piglatin, piglatin_to_word
+    word_to_piglatin = functools.lru_cache(maxsize=size)(translate_word)
+    piglatin_to_word = functools.lru_cache(maxsize=size)(decode_word)
+
+# Get the counters of a translation cache as a dictionary, with
+# its hits, misses, hit rate, and current and maximum size.
+# * decode -> Get the decoder's cache instead of the forward one.
+def word_cache_stats(decode=False):
+    info = (piglatin_to_word if decode else word_to_piglatin).cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits":     info.hits,
+        "misses":   info.misses,
+        "hit_rate": info.hits / lookups if lookups > 0 else 0.0,
+        "size":     info.currsize,
+        "max_size": info.maxsize
+    }
+
+# Translate Pig Latin text back to English, in a single pass.
+# Words are decoded one at a time (see piglatin_to_word), and
+# separators are kept as they are.
+# The end of the text needs care, since string_to_piglatin
+# always treats the last character as part of the last word:
+# "hi!" becomes "i!hay", and "a h!" and "a !h" both become
+# "aay !hay". The trailing separator reading is used when the
+# word before it is not Pig Latin, or when only a single
+# separator comes before the last word (as in "aay !hay").
+# Otherwise, when the word could end with punctuation ("Take a."
+# and "Take .a" both become "Aketay .aay"), that reading is
+# used unless the word list only knows the other word; after
+# whitespace, the normal reading is kept unless the word list
+# only knows the trailing one. A lone "i" that lost its case
+# comes back as "I".
+# When both readings are made of valid Pig Latin words, the
+# words are kept apart unless the word list only knows the
+# joined word.
+# * data     -> The Pig Latin text.
+# * wordlist -> An optional set of words, from load_wordlist.
+# * final    -> Whether 'data' ends the text. Pass False for all
+#               but the last piece when decoding in pieces.
+def piglatin_to_string(data, wordlist=None, final=True):
+    pieces = WORD_SPLIT.split(data)
+    tail = ""
+    if final and len(pieces) >= 3:
+        prev_word, sep, last = pieces[-3], pieces[-2], pieces[-1]
+        # The last word could only have swallowed prev_word too
+        # if nothing but the one separator is between them.
+        if len(sep) > 1:
+            prev_word = ""
+        eos = None
+        if last in ("ay", "AY"):
+            # The text ended with a separator straight after another one.
+            eos = sep[-1]
+        elif len(last) == 3 and last[-2:] in ("ay", "AY"):
+            joined = prev_word + sep[-1] + last
+            eos = piglatin_to_word(joined)
+            if eos == joined:
+                eos = None
+            elif prev_word == "":
+                # Only the separators differ between the readings.
+                # Punctuation usually ends a word ("Am I?") and
+                # whitespace doesn't ("Hello, a"), so prefer that,
+                # unless the word list only knows the other word.
+                normal = piglatin_to_word(last, wordlist)
+                if wordlist is None:
+                    normal_known, eos_known = True, True
+                else:
+                    normal_known, eos_known = in_wordlist(normal, wordlist), in_wordlist(eos[:-1], wordlist)
+                if sep[-1].isspace():
+                    if normal_known or not eos_known:
+                        eos = None
+                elif normal_known and not eos_known:
+                    eos = None
+            elif piglatin_to_word(prev_word, wordlist) != prev_word:
+                # Both readings are valid. Keep the words as they are,
+                # unless the word list only knows the joined one.
+                split_known = wordlist is not None and all(
+                    in_wordlist(w, wordlist) for w in (piglatin_to_word(prev_word, wordlist), last[0]))
+                if wordlist is None or split_known or not in_wordlist(eos[:-1], wordlist):
+                    eos = None
+        if eos is not None:
+            if len(eos) == 2 and eos[0] == "i":
+                # Case can't survive behind a separator; "I" is the word.
+                eos = "I" + eos[1]
+            if prev_word != "":
+                pieces = pieces[:-3] + [""]
+                tail = eos
+            else:
+                pieces = pieces[:-2]
+                tail = sep[:-1] + eos
+
+    if wordlist is None:
+        pieces[0::2] = map(piglatin_to_word, pieces[0::2])
+    else:
+        pieces[0::2] = [piglatin_to_word(word, wordlist) for word in pieces[0::2]]
+    return "".join(pieces) + tail
+
+# Translate a text stream into another, one chunk at a time.
+# Each chunk is cut at a token boundary, and the rest is carried
+# into the next chunk, so memory use stays at about one chunk
+# whatever the input size. When encoding, the last character is
+# always carried, since it may end the text; when decoding, the
+# last three tokens are, since piglatin_to_string needs them at
+# the end of the text. A trailing line break is written as it is.
+# * src        -> A text file object to read from.
+# * dst        -> A text file object to write to.
+# * decode     -> Translate from Pig Latin instead.
+# * wordlist   -> An optional set of words for the decoder.
+# * chunk_size -> Number of characters read per chunk.
+def piglatin_stream(src, dst, decode=False, wordlist=None, chunk_size=CHUNK_SIZE):
+    carry = ""
+    while True:
+        chunk = src.read(chunk_size)
+        if not chunk:
+            break
+        buf = carry + chunk
+        if decode:
+            # Line breaks at the end may end the file, so they're
+            # carried along with the last three tokens before them.
+            text = buf.rstrip("\r\n")
+            pieces = WORD_SPLIT.split(text)
+            if len(pieces) <= 3:
+                carry = buf
+                continue
+            carry = "".join(pieces[-3:]) + buf[len(text):]
+            dst.write(piglatin_to_string("".join(pieces[:-3]), wordlist, final=False))
+        else:
+            # Find the last separator before the final character,
+            # not counting line breaks at the end, which may end the file.
+            i = max(len(buf.rstrip("\r\n")) - 2, -1)
+            while i >= 0 and buf[i] in WORD_CHARS:
+                i -= 1
+            carry = buf[i + 1:]
+            dst.write(string_to_piglatin_fast(buf[:i + 1], final=False))
+    # The file's trailing line break isn't part of its last word,
+    # so the end of the text is taken to be just before it, as it
+    # is for a line typed at the prompt.
+    text = carry.rstrip("\r\n")
+    if decode:
+        dst.write(piglatin_to_string(text, wordlist))
+    else:
+        dst.write(string_to_piglatin_fast(text))
+    dst.write(carry[len(text):])
+    dst.flush()
+
+# The interactive prompt mode.
+# * decode   -> Translate from Pig Latin instead.
+# * wordlist -> An optional set of words for the decoder.
+def interactive_main(decode=False, wordlist=None):
+    while True:
+        if decode:
+            print("Translates to: " + piglatin_to_string(input("Enter the Pig Latin you wish to translate back:\n"), wordlist))
+            continue
+        print("Translates to: " + string_to_piglatin(input("Enter the text you wish to translate into Pig Latin:\n")))
+
+# The main method. This is called once when the program is executed.
+# * args -> The command-line arguments passed into the program.
+def main_func(args):
+    parser = argparse.ArgumentParser(description="Translate text to Pig Latin.")
+    parser.add_argument("--check", type=int, metavar="N", help="compare the fast translator with the original on N random texts, and check the decoder's round trips")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for --check")
+    parser.add_argument("--decode", action="store_true", help="translate from Pig Latin back to English")
+    parser.add_argument("--wordlist", metavar="PATH", help="word list the decoder uses to settle ambiguous words")
+    parser.add_argument("--in", dest="in_path", metavar="PATH", help="file to translate (default: stdin)")
+    parser.add_argument("--out", dest="out_path", metavar="PATH", help="file to write (default: stdout)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, metavar="CHARS", help="characters read per chunk")
+    parser.add_argument("--cache-size", type=int, default=WORD_CACHE_SIZE, metavar="WORDS",
+                        help="translated words to keep cached (default: {})".format(WORD_CACHE_SIZE))
+    parser.add_argument("--cache-stats", action="store_true", help="print the word cache's hit rate to stderr when done")
+    opts = parser.parse_args(args[1:])
+    if opts.chunk_size < 1:
+        parser.error("--chunk-size must be positive, got {}".format(opts.chunk_size))
+
+    if opts.cache_size != WORD_CACHE_SIZE:
+        set_word_cache_size(opts.cache_size)
+
+    if opts.check is not None:
+        failures = check_fast_translator(opts.check, opts.seed)
+        print("{:,} of {:,} random texts matched.".format(opts.check - failures, opts.check))
+        round_trip_failures = check_round_trip()
+        print("{:,} of {:,} round trip texts matched.".format(len(ROUND_TRIP_TEXTS) - round_trip_failures, len(ROUND_TRIP_TEXTS)))
+        sys.exit(1 if failures or round_trip_failures else 0)
+    wordlist = load_wordlist(opts.wordlist) if opts.wordlist else None
+
+    # Only prompt when a person is typing.
+    if opts.in_path is None and opts.out_path is None and sys.stdin.isatty():
+        interactive_main(opts.decode, wordlist)
+        return
+
+    # newline="" keeps the input's line endings as they are.
+    if opts.in_path:
+        src = open(opts.in_path, "rt", encoding="utf-8", newline="")
+    else:
+        src = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", newline="")
+    if opts.out_path:
+        dst = open(opts.out_path, "wt", encoding="utf-8", newline="")
+    else:
+        dst = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", newline="")
+    try:
+        piglatin_stream(src, dst, opts.decode, wordlist, opts.chunk_size)
+    finally:
+        if opts.in_path:
+            src.close()
+        if opts.out_path:
+            dst.close()
+
+    if opts.cache_stats:
+        stats = word_cache_stats(opts.decode)
+        print("Word cache: {:,} hits, {:,} misses ({:.1%} hit rate), {:,} of {:,} words kept.".format(
+            stats["hits"], stats["misses"], stats["hit_rate"], stats["size"], stats["max_size"]), file=sys.stderr)
+
+# Call the main method
+if __name__ == "__main__":
+    main_func(sys.argv)
\ No newline at end of file
@@ -10,9 +10,45 @@
 # Write a program that prints the number value 
 # of an input word. (Hint: ord('A'.lower())-96 = 1).
 # -- -- -- -- -- -- -- -- -- -- -- -- --
+# Run in a terminal for the interactive prompt,
+# or pipe words in (or name files) to get
+# 'word<TAB>value' lines back:
+#   python3 a4_alpha_vals.py --jobs 4 words.txt > values.tsv
+# With --unicode, accented letters count as
+# their plain letters (é -> e, ß -> ss).
+# -- -- -- -- -- -- -- -- -- -- -- -- --
+
+# Imports
+import os          # For file sizes and replacing index files.
+import sys         # For command-line arguments and the binary stdin/stdout.
+import mmap        # For mapping index files and word lists.
+import zlib        # For zlib.crc32() of the indexed part of a word list.
+import time        # For timing the benchmark.
+import array       # For building index arrays without NumPy.
+import struct      # For the index file header.
+import argparse    # For parsing the command-line arguments.
+import functools   # For functools.lru_cache of rare code point values.
+import unicodedata # For folding accented letters in unicode mode.
+import collections # For collections.deque of pending worker results.
+from concurrent.futures import ProcessPoolExecutor # Scores chunks in parallel.
+
+# NumPy is optional. It is only used to score whole word
+# lists at once; a plain loop is used without it.
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 # Constants
 VALID_CHARS = "abcdefghijklmnopqrstuvwxyz"
+CHUNK_SIZE  = 4 * 1024 * 1024 # Bytes of words read per chunk when streaming. (4 MiB)
+INDEX_MAGIC  = b"AVIX"      # First bytes of a value index file.
+INDEX_HEADER = "=4sIQIIII"   # magic, version, source size, source CRC, word count, max value, pad.
+INDEX_VERSION = 2
+BMP_SIZE = 0x10000          # Code points in the Basic Multilingual Plane.
+
+# Global variables.
+unicode_table = None # Value of every BMP code point. Built on first use.
 
 # Get x's position in the alphabet from 1-26.
 def get_alphabet_pos(x):
@@ -37,7 +73,428 @@ def get_word_value(data):
         sum += get_alphabet_pos(i)
     return sum
 
-# Get input, compute sum, and print.
-print("-- Alphabet Values --")
-while True:
-    print("Value: ", get_word_value(input("Enter a string you wish to get the value of.\n").lower()))
\ No newline at end of file
+# Build the lookup table the bulk scorer uses: the value
+# of every byte, which is zero for anything but a letter.
+# * lower -> Also give uppercase letters their value.
+def get_byte_values(lower=False):
+    table = [0] * 256
+    for i in VALID_CHARS:
+        table[ord(i)] = get_alphabet_pos(i)
+        if lower:
+            table[ord(i.upper())] = get_alphabet_pos(i)
+    return table
+
+# Score every word of a newline-separated word list at once.
+# Gives exactly what get_word_value gives for each line, but
+# with NumPy the whole buffer is scored in a few array passes:
+# each byte is looked up in a table, and np.add.reduceat sums
+# the bytes between line starts. Every line keeps its newline
+# (which is worth zero), so no line is ever an empty slice.
+# Returns the values, one per line, as a NumPy array (or a list
+# without NumPy). A trailing newline does not add a word.
+# * data  -> The word list as bytes, e.g. from open(path, "rb").read().
+# * lower -> Score uppercase letters as if they were lowercase.
+def get_word_values(data, lower=False):
+    if numpy is None:
+        lines = data.decode("utf-8", "replace").split("\n")
+        if lines[-1] == "":
+            lines.pop()
+        return [get_word_value(line.lower() if lower else line) for line in lines]
+
+    buf = numpy.frombuffer(data, dtype=numpy.uint8)
+    if len(buf) == 0:
+        return numpy.zeros(0, dtype=numpy.int64)
+    values = numpy.array(get_byte_values(lower), dtype=numpy.int64)[buf]
+    return numpy.add.reduceat(values, get_word_starts(data))
+
+# Find the offset each line of a word list starts at.
+# A trailing newline does not start another line.
+# Returns a NumPy array (or a list without NumPy).
+# * data -> The word list as bytes.
+def get_word_starts(data):
+    if numpy is None:
+        starts = []
+        i = 0
+        while i < len(data):
+            starts.append(i)
+            i = data.find(b"\n", i)
+            if i < 0:
+                break
+            i += 1
+        return starts
+
+    buf = numpy.frombuffer(data, dtype=numpy.uint8)
+    starts = numpy.flatnonzero(buf == 0x0A) + 1
+    return numpy.concatenate(([0], starts[starts < len(buf)])).astype(numpy.int64)
+
+# Score every word of a word list file. (See get_word_values)
+# * path  -> The path of the newline-separated word list.
+# * lower -> Score uppercase letters as if they were lowercase.
+def get_file_values(path, lower=False):
+    with open(path, "rb") as f:
+        return get_word_values(f.read(), lower)
+
+# Get the value of a single code point in unicode mode.
+# The character is folded as NFKD, then case-folded, and then
+# every plain letter left is counted, so 'É' is worth 5 (e),
+# 'ß' is worth 38 (ss), and marks and non-Latin letters are 0.
+# Only called for code points the BMP table does not cover.
+# * cp -> The code point.
+@functools.lru_cache(maxsize=4096)
+def get_codepoint_value(cp):
+    folded = unicodedata.normalize("NFKD", unicodedata.normalize("NFKD", chr(cp)).casefold())
+    return get_word_value(folded)
+
+# Get the value table for every code point in the BMP, so that
+# unicode mode costs a list lookup per character. The table is
+# built the first time it is needed.
+def get_unicode_table():
+    global unicode_table
+    if unicode_table is None:
+        unicode_table = [get_codepoint_value.__wrapped__(cp) for cp in range(BMP_SIZE)]
+    return unicode_table
+
+# Get the value of a word in unicode mode. (See get_codepoint_value)
+# * data -> The string to get the value of.
+def get_word_value_unicode(data):
+    table = get_unicode_table()
+    try:
+        return sum(map(table.__getitem__, map(ord, data)))
+    except IndexError:
+        # Some character is outside the BMP.
+        return sum(table[cp] if cp < BMP_SIZE else get_codepoint_value(cp) for cp in map(ord, data))
+
+# Score every word of a word list at once, in unicode mode.
+# Works like get_word_values, but on UTF-32 code points.
+# * data -> The word list as UTF-8 bytes.
+def get_word_values_unicode(data):
+    text = data.decode("utf-8", "replace")
+    if numpy is None:
+        lines = text.split("\n")
+        if lines[-1] == "":
+            lines.pop()
+        return [get_word_value_unicode(line) for line in lines]
+
+    cps = numpy.frombuffer(text.encode("utf-32-le"), dtype=numpy.uint32)
+    if len(cps) == 0:
+        return numpy.zeros(0, dtype=numpy.int64)
+    values = numpy.array(get_unicode_table(), dtype=numpy.int64)[numpy.minimum(cps, BMP_SIZE - 1)]
+    for i in numpy.flatnonzero(cps >= BMP_SIZE):
+        values[i] = get_codepoint_value(int(cps[i]))
+    starts = numpy.flatnonzero(cps == 0x0A) + 1
+    starts = numpy.concatenate(([0], starts[starts < len(cps)]))
+    return numpy.add.reduceat(values, starts)
+
+# Write a value index file. The file holds, after its header:
+#   offsets -> (max value + 2) uint32s. The ids of the words worth v
+#              are ids[offsets[v]:offsets[v + 1]].
+#   ids     -> One uint32 word id per word, grouped by value, and in
+#              word order within each value.
+#   values  -> One uint32 value per word id.
+#   starts  -> (word count + 1) uint64 offsets of each word in the
+#              source, plus the end of the indexed source.
+# * index_path  -> The path of the index file to write.
+# * source_size -> The number of bytes of the source indexed.
+# * source_crc  -> The CRC of the indexed source.
+# * values      -> A list of the value of every word.
+# * starts      -> A list of the offset of every word, plus the end.
+def index_write(index_path, source_size, source_crc, values, starts):
+    max_value = max(values) if len(values) else 0
+
+    # Group the word ids by value, in a counting sort.
+    if numpy is not None:
+        vals = numpy.asarray(values, dtype=numpy.int64)
+        counts = numpy.bincount(vals, minlength=max_value + 1)
+        offsets = array.array("I", numpy.concatenate(([0], numpy.cumsum(counts))).astype(numpy.uint32).tobytes())
+        ids = array.array("I", numpy.argsort(vals, kind="stable").astype(numpy.uint32).tobytes())
+    else:
+        offsets = array.array("I", [0] * (max_value + 2))
+        for v in values:
+            offsets[v + 1] += 1
+        for v in range(1, max_value + 2):
+            offsets[v] += offsets[v - 1]
+        ids = array.array("I", [0] * len(values))
+        fill = offsets.tolist()
+        for word_id, v in enumerate(values):
+            ids[fill[v]] = word_id
+            fill[v] += 1
+
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(struct.pack(INDEX_HEADER, INDEX_MAGIC, INDEX_VERSION, source_size, source_crc, len(values), max_value, 0))
+        f.write(offsets.tobytes())
+        f.write(ids.tobytes())
+        f.write(array.array("I", values).tobytes())
+        if f.tell() % 8:
+            f.write(bytes(8 - f.tell() % 8))
+        f.write(array.array("Q", starts).tobytes())
+    os.replace(tmp_path, index_path)
+
+# Get the CRC of the source up to 'end', which shows whether the
+# indexed part of a source has been changed.
+# * data -> The source word list.
+# * end  -> The end of the indexed part of the source.
+def index_crc(data, end):
+    return zlib.crc32(memoryview(data)[:end])
+
+# Build, or bring up to date, the value index of a word list.
+# If words have only been appended to the source since the index
+# was written, only the new words are scored, and the old values
+# are kept. Any other change rebuilds the index from scratch.
+# An index that is already up to date is left as it is.
+# Returns the number of words that were scored.
+# * source_path -> The path of the newline-separated word list.
+# * index_path  -> The path of the index file.
+def index_update(source_path, index_path):
+    with open(source_path, "rb") as f:
+        data = f.read()
+
+    # See how much of the source the old index covers, if any.
+    values, starts = [], [0]
+    reused = False
+    try:
+        with value_index(index_path) as old:
+            if (old.source_size <= len(data)
+                    and (old.source_size == 0 or data[old.source_size - 1:old.source_size] == b"\n")
+                    and old.source_crc == index_crc(data, old.source_size)):
+                values = old.values.tolist()
+                starts = old.starts.tolist()
+                reused = True
+    except (FileNotFoundError, ValueError):
+        pass
+    done = starts[-1]
+
+    # Score the new words, and shift their offsets to the source's.
+    # Nothing new is not merged, as get_word_starts(b"") is [0],
+    # which would add a start for a word that isn't there.
+    new_data = data[done:]
+    if not new_data:
+        if reused:
+            return 0
+        new_values = []
+    else:
+        new_values = get_word_values(new_data)
+        new_starts = get_word_starts(new_data)
+        values += [int(v) for v in new_values]
+        starts = starts[:-1] + [done + int(i) for i in new_starts] + [len(data)]
+
+    index_write(index_path, len(data), index_crc(data, len(data)), values, starts)
+    return len(new_values)
+
+# A memory-mapped value index. Lookups slice the mapped arrays
+# directly, so they take microseconds whatever the index size.
+# Use it as a context manager, or call close() when done.
+class value_index:
+    # Constructor.
+    # * index_path  -> The path of the index file.
+    # * source_path -> The word list, needed to turn ids into words.
+    def __init__(self, index_path, source_path=None):
+        self.index_file = open(index_path, "rb")
+        self.source_file = None
+        self.source_map = None
+        try:
+            self.index_map = mmap.mmap(self.index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.index_file.close()
+            raise ValueError("'{}' is not a value index".format(index_path))
+        header_size = struct.calcsize(INDEX_HEADER)
+        if len(self.index_map) < header_size:
+            self.close()
+            raise ValueError("'{}' is not a value index".format(index_path))
+        magic, version, self.source_size, self.source_crc, self.word_count, self.max_value, pad = \
+            struct.unpack_from(INDEX_HEADER, self.index_map)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            self.close()
+            raise ValueError("'{}' is not a value index".format(index_path))
+
+        # Make sure the file holds all the arrays the header says it does.
+        size = header_size + 4 * (self.max_value + 2) + 8 * self.word_count
+        size += -size % 8 + 8 * (self.word_count + 1)
+        if len(self.index_map) < size:
+            self.close()
+            raise ValueError("'{}' is truncated".format(index_path))
+
+        # Cast each array straight out of the mapping, without copying.
+        view = memoryview(self.index_map)
+        pos = header_size
+        self.offsets = view[pos:pos + 4 * (self.max_value + 2)].cast("I")
+        pos += 4 * (self.max_value + 2)
+        self.ids = view[pos:pos + 4 * self.word_count].cast("I")
+        pos += 4 * self.word_count
+        self.values = view[pos:pos + 4 * self.word_count].cast("I")
+        pos += 4 * self.word_count
+        pos += -pos % 8
+        self.starts = view[pos:pos + 8 * (self.word_count + 1)].cast("Q")
+
+        if source_path is not None:
+            self.source_file = open(source_path, "rb")
+            if os.fstat(self.source_file.fileno()).st_size > 0:
+                self.source_map = mmap.mmap(self.source_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # Unmap and close the index and word list.
+    def close(self):
+        for name in ("offsets", "ids", "values", "starts"):
+            if hasattr(self, name):
+                getattr(self, name).release()
+        self.index_map.close()
+        self.index_file.close()
+        if self.source_map is not None:
+            self.source_map.close()
+        if self.source_file is not None:
+            self.source_file.close()
+
+    # Get the ids of the words worth from 'low' to 'high'.
+    # Words are grouped by value, so this is a single slice.
+    # * low  -> The lowest value.
+    # * high -> The highest value. Defaults to 'low'.
+    def lookup(self, low, high=None):
+        if high is None:
+            high = low
+        low = max(low, 0)
+        high = min(high, self.max_value)
+        if low > high:
+            return []
+        return self.ids[self.offsets[low]:self.offsets[high + 1]].tolist()
+
+    # Get the word with the given id from the word list.
+    # * word_id -> The id of the word, its line number from zero.
+    def word(self, word_id):
+        return self.source_map[self.starts[word_id]:self.starts[word_id + 1]] \
+            .rstrip(b"\r\n").decode("utf-8", "replace")
+
+    # Get the words worth from 'low' to 'high'. (See lookup)
+    def lookup_words(self, low, high=None):
+        return [self.word(i) for i in self.lookup(low, high)]
+
+# Read a binary stream in chunks of whole lines. The partial
+# line at the end of each read is carried into the next chunk.
+# * src        -> A binary file object to read from.
+# * chunk_size -> Roughly how many bytes to read per chunk.
+def read_line_chunks(src, chunk_size=CHUNK_SIZE):
+    carry = b""
+    while True:
+        data = src.read(chunk_size)
+        if not data:
+            break
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            carry += data
+            continue
+        yield carry + data[:end]
+        carry = data[end:]
+    if carry:
+        yield carry
+
+# Score a chunk of lines, ignoring case like the prompt does.
+# Returns the 'word<TAB>value' output lines as one bytes object.
+# * chunk   -> Bytes holding whole newline-separated lines.
+# * unicode -> Fold accented letters to plain ones.
+def score_chunk(chunk, unicode=False):
+    words = chunk.split(b"\n")
+    if words[-1] == b"":
+        words.pop()
+    values = get_word_values_unicode(chunk) if unicode else get_word_values(chunk, lower=True)
+    return b"".join(b"%s\t%d\n" % (word.rstrip(b"\r"), value) for word, value in zip(words, values))
+
+# Stream words from one file into 'word<TAB>value' lines in
+# another. With more than one job, chunks are scored by worker
+# processes, and only a few chunks per worker are kept in flight
+# so memory use stays flat. Output keeps the input's order.
+# * src        -> A binary file object to read words from.
+# * dst        -> A binary file object to write lines to.
+# * jobs       -> The number of worker processes.
+# * chunk_size -> Roughly how many bytes to read per chunk.
+# * unicode    -> Fold accented letters to plain ones.
+def score_stream(src, dst, jobs=1, chunk_size=CHUNK_SIZE, unicode=False):
+    if jobs <= 1:
+        for chunk in read_line_chunks(src, chunk_size):
+            dst.write(score_chunk(chunk, unicode))
+        return
+
+    with ProcessPoolExecutor(jobs) as pool:
+        pending = collections.deque()
+        for chunk in read_line_chunks(src, chunk_size):
+            pending.append(pool.submit(score_chunk, chunk, unicode))
+            if len(pending) >= 2 * jobs:
+                dst.write(pending.popleft().result())
+        while pending:
+            dst.write(pending.popleft().result())
+
+# Compare the speed of the ASCII and unicode scorers on a word
+# list, both per word and in bulk, and print words per second.
+# The unicode table is built before timing starts.
+# * data   -> The word list as UTF-8 bytes.
+# * repeat -> How many times to time each scorer. The best is kept.
+def benchmark(data, repeat=3):
+    words = data.decode("utf-8", "replace").split("\n")
+    get_unicode_table()
+    tests = [
+        ("ascii   (per word)", lambda: [get_word_value(w.lower()) for w in words]),
+        ("unicode (per word)", lambda: [get_word_value_unicode(w) for w in words]),
+        ("ascii   (bulk)",     lambda: get_word_values(data, lower=True)),
+        ("unicode (bulk)",     lambda: get_word_values_unicode(data))
+    ]
+    for name, func in tests:
+        best = None
+        for i in range(repeat):
+            time_start = time.perf_counter()
+            func()
+            secs = time.perf_counter() - time_start
+            best = secs if best is None else min(best, secs)
+        print("{}: {:,.0f} words/s".format(name, len(words) / best if best > 0 else 0.0))
+
+# The interactive prompt mode. Gets input, computes sum, and prints.
+def interactive_main():
+    print("-- Alphabet Values --")
+    while True:
+        print("Value: ", get_word_value(input("Enter a string you wish to get the value of.\n").lower()))
+
+# The main method. Runs the prompt in a terminal, and
+# streams words from files or piped input otherwise.
+# * args -> The command-line arguments passed into the program.
+def main_func(args):
+    parser = argparse.ArgumentParser(description="Print the alphabet value of every word.")
+    parser.add_argument("files", nargs="*", metavar="FILE", help="newline-separated word lists ('-' for stdin)")
+    parser.add_argument("--jobs", type=int, default=1, metavar="N", help="worker processes to score with (default: 1)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, metavar="BYTES", help="bytes read per chunk")
+    parser.add_argument("--unicode", action="store_true", help="count accented letters as plain ones (é -> e, ß -> ss)")
+    parser.add_argument("--benchmark", action="store_true", help="time the ASCII and unicode scorers on the words instead")
+    opts = parser.parse_args(args[1:])
+    if opts.chunk_size < 1:
+        parser.error("--chunk-size must be positive, got {}".format(opts.chunk_size))
+    if opts.jobs < 1:
+        parser.error("--jobs must be at least 1, got {}".format(opts.jobs))
+
+    if opts.benchmark:
+        data = b""
+        for path in opts.files or ["-"]:
+            if path == "-":
+                data += sys.stdin.buffer.read()
+                continue
+            with open(path, "rb") as src:
+                data += src.read()
+        benchmark(data)
+        return
+
+    if not opts.files and sys.stdin.isatty():
+        interactive_main()
+        return
+
+    dst = sys.stdout.buffer
+    for path in opts.files or ["-"]:
+        if path == "-":
+            score_stream(sys.stdin.buffer, dst, opts.jobs, opts.chunk_size, opts.unicode)
+            continue
+        with open(path, "rb") as src:
+            score_stream(src, dst, opts.jobs, opts.chunk_size, opts.unicode)
+    dst.flush()
+
+# Call the main method
+if __name__ == "__main__":
+    main_func(sys.argv)
\ No newline at end of file
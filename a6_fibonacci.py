@@ -13,28 +13,333 @@
 # the even terms in the Fibonacci sequence 
 # below twenty million. 
 # -- -- -- -- -- -- -- -- -- -- -- -- --
+# The bound can be given on the command line,
+# and may be written as a power for huge bounds:
+#   python3 a6_fibonacci.py 10^10000
+# Several bounds are answered in one sweep
+# over a cached table of the even terms:
+#   python3 a6_fibonacci.py 100 1000 20000000
+# Sums of the even terms up to the n'th term,
+# modulo m, work for any size of n:
+#   python3 a6_fibonacci.py --index 10^18 --mod 1000000007
+# -- -- -- -- -- -- -- -- -- -- -- -- --
+
+# Imports
+import sys      # For command-line arguments.
+import math     # For math.log() when estimating term counts.
+import argparse # For parsing the command-line arguments.
+import bisect   # For binary searches of the cached term table.
+import array    # For compact Pisano periods.
+
+# NumPy is optional. It is only used to evaluate many
+# modular sums at once; a plain loop is used without it.
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 # Constants
-MAXIMUM = 20000000
-
-# Main variables.
-prev0 = 1 # The previous number.
-prev1 = 0 # The number before the previous.
-cur = 1   # The current number.
-sum = 0   # The total summed.
-term_count = 0 # Number of terms used in sum.
-
-# Repeat until we reach the maximum number.
-while cur < MAXIMUM:
-    # Some Fibonacci computing...
-    cur = prev0 + prev1
-    prev1 = prev0
-    prev0 = cur
-
-    # Add even values
-    if cur % 2 == 0 and cur < MAXIMUM:
-        sum += cur
+MAXIMUM = 20000000 # The default bound.
+PHI = (1 + 5 ** 0.5) / 2 # The golden ratio.
+PISANO_LIMIT = 1 << 10   # Moduli up to this can have their Pisano period cached. (At most 1 << 16, so terms fit an "H" array.)
+PISANO_CACHE_SIZE = 256  # Most Pisano periods kept at once. (At most 24 KiB each.)
+NUMPY_MOD_LIMIT = 1 << 30 # Largest modulus the NumPy path can square in int64.
+
+# Global variables.
+even_terms = [2] # Cached even Fibonacci terms, in order. Grows as needed.
+even_sums  = [2] # even_sums[i] is the sum of even_terms[0] to even_terms[i].
+pisano_cache = {} # One period of F(n) mod m, keyed by m, oldest first.
+pisano_seen  = set() # Moduli fib_mod() has been asked for once.
+
+# Sum the even Fibonacci terms below 'maximum' by walking
+# every term. This is the original algorithm, kept as a
+# reference for the faster engines below.
+# Returns (sum, term count).
+# * maximum -> The bound all summed terms are below.
+def even_fib_sum_naive(maximum):
+    # Main variables.
+    prev0 = 1 # The previous number.
+    prev1 = 0 # The number before the previous.
+    cur = 1   # The current number.
+    sum = 0   # The total summed.
+    term_count = 0 # Number of terms used in sum.
+
+    # Repeat until we reach the maximum number.
+    while cur < maximum:
+        # Some Fibonacci computing...
+        cur = prev0 + prev1
+        prev1 = prev0
+        prev0 = cur
+
+        # Add even values
+        if cur % 2 == 0 and cur < maximum:
+            sum += cur
+            term_count += 1
+    return (sum, term_count)
+
+# Sum the even Fibonacci terms below 'maximum' by stepping
+# from one even term straight to the next. Every third term
+# is even, and they follow E(n) = 4E(n-1) + E(n-2), so the odd
+# terms and the '% 2' test are skipped entirely.
+# Returns (sum, term count).
+# * maximum -> The bound all summed terms are below.
+def even_fib_sum_step(maximum):
+    prev = 0 # The previous even term. (F(0))
+    cur = 2  # The current even term. (F(3))
+    total = 0
+    term_count = 0
+    while cur < maximum:
+        total += cur
         term_count += 1
+        prev, cur = cur, 4 * cur + prev
+    return (total, term_count)
+
+# Compute F(n) and F(n + 1) in O(log n) steps by fast doubling:
+#   F(2k)     = F(k) * (2F(k + 1) - F(k))
+#   F(2k + 1) = F(k)^2 + F(k + 1)^2
+# * n -> The index of the term, from zero.
+def fib_pair(n):
+    a, b = 0, 1 # F(0), F(1)
+    for bit in bin(n)[2:]:
+        c = a * (2 * b - a)
+        d = a * a + b * b
+        if bit == "1":
+            a, b = d, c + d
+        else:
+            a, b = c, d
+    return (a, b)
+
+# Sum the first k even Fibonacci terms in O(log k) steps.
+# The even terms are F(3), F(6), F(9), ..., and their sum
+# has the closed form (F(3k + 2) - 1) / 2.
+# * k -> The number of even terms to sum.
+def even_fib_sum_terms(k):
+    if k <= 0:
+        return 0
+    return (fib_pair(3 * k + 2)[0] - 1) // 2
+
+# Count the even Fibonacci terms below 'maximum'.
+# F(n) is close to PHI^n / sqrt(5), which gives a first guess
+# that is then corrected by checking terms either side of it.
+# * maximum -> The bound all counted terms are below.
+def even_fib_count(maximum):
+    if maximum <= 2:
+        return 0
+    k = int((math.log(maximum) + math.log(5) / 2) / math.log(PHI) / 3)
+    while k > 0 and fib_pair(3 * k)[0] >= maximum:
+        k -= 1
+    while fib_pair(3 * (k + 1))[0] < maximum:
+        k += 1
+    return k
+
+# Sum the even Fibonacci terms below 'maximum' in O(log n) steps,
+# by counting the terms and then using the closed form.
+# Returns (sum, term count).
+# * maximum -> The bound all summed terms are below.
+def even_fib_sum_fast(maximum):
+    k = even_fib_count(maximum)
+    return (even_fib_sum_terms(k), k)
+
+# Grow the cached tables until they hold the first even
+# term that is not below 'maximum'.
+# * maximum -> The bound the tables must reach.
+def even_table_extend(maximum):
+    prev = even_terms[-2] if len(even_terms) > 1 else 0
+    cur = even_terms[-1]
+    total = even_sums[-1]
+    while cur < maximum:
+        prev, cur = cur, 4 * cur + prev
+        total += cur
+        even_terms.append(cur)
+        even_sums.append(total)
+
+# Sum the even Fibonacci terms below 'maximum' from the cached
+# tables. After the tables have grown past the bound, each
+# query is a binary search, so repeats cost O(log n).
+# Returns (sum, term count).
+# * maximum -> The bound all summed terms are below.
+def even_fib_sum_cached(maximum):
+    even_table_extend(maximum)
+    k = bisect.bisect_left(even_terms, maximum)
+    return (even_sums[k - 1] if k > 0 else 0, k)
+
+# Answer many bounds at once. The tables are grown once for
+# the largest bound, then the sorted bounds are answered in
+# a single sweep along them.
+# Returns a list of (sum, term count), in the order of 'bounds'.
+# * bounds -> A list of bounds.
+def even_fib_sum_batch(bounds):
+    if not bounds:
+        return []
+    even_table_extend(max(bounds))
+    results = [None] * len(bounds)
+    k = 0
+    for i in sorted(range(len(bounds)), key=bounds.__getitem__):
+        while even_terms[k] < bounds[i]:
+            k += 1
+        results[i] = (even_sums[k - 1] if k > 0 else 0, k)
+    return results
+
+# Compute F(n) and F(n + 1) modulo m by fast doubling.
+# (See fib_pair)
+# * n -> The index of the term, from zero.
+# * m -> The modulus.
+def fib_pair_mod(n, m):
+    if n < 0:
+        raise ValueError("index must not be negative, got {}".format(n))
+    a, b = 0, 1 % m
+    for bit in bin(n)[2:]:
+        c = a * (2 * b - a) % m
+        d = (a * a + b * b) % m
+        if bit == "1":
+            a, b = d, (c + d) % m
+        else:
+            a, b = c, d
+    return (a, b)
+
+# Get one Pisano period of the Fibonacci sequence modulo m,
+# i.e. F(0) to F(p - 1) mod m, after which it repeats.
+# The period is at most 6m long, and is cached per modulus. Only
+# the last PISANO_CACHE_SIZE periods are kept.
+# * m -> The modulus.
+def pisano_period(m):
+    period = pisano_cache.pop(m, None)
+    if period is None:
+        period = array.array("H", [0])
+        a, b = 0, 1 % m
+        while True:
+            a, b = b, (a + b) % m
+            if a == 0 and b == 1 % m:
+                break
+            period.append(a)
+        if len(pisano_cache) >= PISANO_CACHE_SIZE:
+            del pisano_cache[next(iter(pisano_cache))]
+    # (Re)insert it as the newest.
+    pisano_cache[m] = period
+    return period
+
+# Compute F(n) modulo m. Small moduli that are asked for more
+# than once look the term up in their cached Pisano period;
+# anything else uses fast doubling, which is cheaper than
+# building a period that is only used once.
+# * n -> The index of the term, from zero.
+# * m -> The modulus.
+def fib_mod(n, m):
+    if n < 0:
+        raise ValueError("index must not be negative, got {}".format(n))
+    if m <= PISANO_LIMIT:
+        if m in pisano_cache or m in pisano_seen:
+            period = pisano_period(m)
+            return period[n % len(period)]
+        if len(pisano_seen) >= PISANO_LIMIT:
+            pisano_seen.clear()
+        pisano_seen.add(m)
+    return fib_pair_mod(n, m)[0]
+
+# Sum the even Fibonacci terms F(0) to F(n), modulo m.
+# The even terms are every third one, so this is the sum of
+# the first n / 3 of them, (F(3k + 2) - 1) / 2. F(3k + 2) is
+# found modulo 2m, so the halving stays exact.
+# * n -> The index of the last term that may be summed.
+# * m -> The modulus.
+def even_fib_sum_mod(n, m):
+    if m < 1:
+        raise ValueError("modulus must be positive, got {}".format(m))
+    if n < 0:
+        raise ValueError("index must not be negative, got {}".format(n))
+    k = n // 3
+    return (fib_mod(3 * k + 2, 2 * m) - 1) // 2 % m
+
+# Sum the even Fibonacci terms modulo m for many (n, m) pairs.
+# With NumPy, fast doubling runs on every pair at once, one
+# bit of n per step. (Leading zero bits leave F(0), F(1) as it
+# is, so pairs with shorter n need no special case.) Indices
+# that don't fit in 63 bits use the scalar path instead.
+# Returns a list of sums, in the order of the pairs.
+# * ns -> A list of term indices.
+# * ms -> A list of moduli, one per index.
+def even_fib_sum_mod_many(ns, ms):
+    if numpy is None or not ns or max(ms) > NUMPY_MOD_LIMIT or min(ms) < 1 or min(ns) < 0:
+        return [even_fib_sum_mod(n, m) for n, m in zip(ns, ms)]
+
+    # Compute F(3k + 2) modulo 2m for every pair.
+    idx = [3 * (n // 3) + 2 for n in ns]
+    top = max(idx)
+    if top >= 1 << 63:
+        return [even_fib_sum_mod(n, m) for n, m in zip(ns, ms)]
+    idx = numpy.array(idx, dtype=numpy.uint64)
+    mod = numpy.array([2 * m for m in ms], dtype=numpy.int64)
+    a = numpy.zeros(len(ns), dtype=numpy.int64)
+    b = numpy.ones(len(ns), dtype=numpy.int64) % mod
+    for shift in range(top.bit_length() - 1, -1, -1):
+        bits = ((idx >> numpy.uint64(shift)) & numpy.uint64(1)).astype(bool)
+        c = a * ((2 * b - a) % mod) % mod
+        d = (a * a % mod + b * b % mod) % mod
+        a, b = numpy.where(bits, d, c), numpy.where(bits, (c + d) % mod, d)
+    return ((a - 1) // 2 % numpy.array(ms, dtype=numpy.int64)).tolist()
+
+# Parse a bound from the command line. Besides plain integers,
+# powers can be written as 'A^B' or 'AeB', e.g. 10^10000.
+# * s -> The string to parse.
+def parse_bound(s):
+    if "^" in s:
+        base, exp = s.split("^", 1)
+        return int(base) ** int(exp)
+    if "e" in s.lower():
+        mantissa, exp = s.lower().split("e", 1)
+        return int(mantissa) * 10 ** int(exp)
+    return int(s.replace(",", "").replace("_", ""))
+
+# The main method. This is called once when the program is executed.
+# * args -> The command-line arguments passed into the program.
+def main_func(args):
+    parser = argparse.ArgumentParser(description="Sum the even terms of the Fibonacci sequence.")
+    parser.add_argument("maximum", nargs="*", default=[str(MAXIMUM)], help="bounds the terms are below, e.g. 20000000 or 10^10000")
+    parser.add_argument("--terms", type=int, metavar="K", help="sum the first K even terms instead")
+    parser.add_argument("--index", metavar="N", help="sum the even terms up to F(N) modulo --mod instead")
+    parser.add_argument("--mod", type=int, metavar="M", help="modulus for --index")
+    parser.add_argument("--method", choices=["fast", "step", "naive", "cached"], default="fast",
+                        help="algorithm to use for a single bound (default: fast). Several bounds always use the cached table")
+    opts = parser.parse_args(args[1:])
+
+    # Huge results have more digits than Python converts by default.
+    if hasattr(sys, "set_int_max_str_digits"):
+        sys.set_int_max_str_digits(0)
+
+    # Print the sum. {:,} format puts commas between thousands.
+    if opts.index is not None or opts.mod is not None:
+        if opts.index is None or opts.mod is None or opts.mod < 1:
+            parser.error("--index and --mod must be given together, with a positive modulus")
+        try:
+            n = parse_bound(opts.index)
+        except ValueError:
+            parser.error("invalid index '{}'".format(opts.index))
+        if n < 0:
+            parser.error("index must not be negative, got {}".format(opts.index))
+        print("Sum of even Fibonacci numbers up to F({:,}) modulo {:,}:\n{:,}".format(n, opts.mod, even_fib_sum_mod(n, opts.mod)))
+        return
+    if opts.terms is not None:
+        print("Sum of the first {:,} even Fibonacci numbers:\n{:,}".format(opts.terms, even_fib_sum_terms(opts.terms)))
+        return
+    bounds = []
+    for s in opts.maximum:
+        try:
+            bounds.append(parse_bound(s))
+        except ValueError:
+            parser.error("invalid bound '{}'".format(s))
+    if len(bounds) > 1:
+        results = even_fib_sum_batch(bounds)
+    else:
+        method = {
+            "fast":   even_fib_sum_fast,
+            "step":   even_fib_sum_step,
+            "naive":  even_fib_sum_naive,
+            "cached": even_fib_sum_cached
+        }[opts.method]
+        results = [method(bounds[0])]
+    for maximum, (sum, term_count) in zip(bounds, results):
+        print("Sum of all Fibonacci numbers under {:,}:\n{:,} ({:,} terms.)".format(maximum, sum, term_count))
 
-# Print the sum. {:,} format puts commas between thousands.
-print("Sum of all Fibonacci numbers under {:,}:\n{:,} ({:,} terms.)".format(MAXIMUM, sum, term_count))
\ No newline at end of file
+# Call the main method
+if __name__ == "__main__":
+    main_func(sys.argv)
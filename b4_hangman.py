@@ -20,20 +20,68 @@
 # And this specific file:
 # https://raw.githubusercontent.com/first20hours/google-10000-english/master/google-10000-english-no-swears.txt
 # -- -- -- -- -- -- -- -- -- -- -- -- --
+# Word lists are compiled into a binary cache
+# the first time they are loaded, so later
+# games start instantly, even offline.
+# -- -- -- -- -- -- -- -- -- -- -- -- --
 
 # Imports
-import sys    # For command-line arguments vector. (sys.argv)
-import random # For rand
+import os       # For file times, sizes and paths of the word list cache.
+import sys      # For command-line arguments vector. (sys.argv)
+import math     # For math.log2() in word difficulty.
+import argparse # For parsing the command-line arguments.
+import mmap     # For mapping the word list cache.
+import array    # For the word offsets in the word list cache.
+import random   # For rand
+import struct   # For the word list cache header.
+import hashlib  # For hashing word list sources.
+import time     # For timing the simulator, and the age of downloaded word lists.
+import asyncio  # For the multiplayer server.
+from concurrent.futures import ProcessPoolExecutor # For simulating games in parallel.
 from urllib.request import urlopen # Used to download word list.
 
+# resource is only on Unix. It lets the server and load test raise
+# the open file limit, so they can hold thousands of connections.
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# NumPy is optional. It lets the solver filter and score whole
+# word lists at once; a plain loop is used without it.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # Global variables.
 wordlist_local    = False # Flag of whether the user passed a custom word list.
 wordlist_file_url = "https://raw.githubusercontent.com/first20hours/google-10000-english/master/google-10000-english-no-swears.txt"
 wordlist_data     = []
+wordlist_index    = None # A word_index over wordlist_data, for picking words.
 word_selected     = ""
 
 # Constants
 HEALTH_DECREMENT  = 100.0 / 8.0 # We allow 8 mistakes.
+WORDLIST_CACHE_DIR = "./wordlist_cache" # Where compiled word lists are kept.
+WORDLIST_MAGIC     = b"HMWL"            # First bytes of a compiled word list.
+WORDLIST_VERSION   = 1
+WORDLIST_HEADER    = "=4sIqq32sIQ"      # magic, version, mtime, size, SHA-256, word count, blob length.
+WORDLIST_MAX_AGE   = 7 * 24 * 60 * 60   # Seconds before a downloaded word list is checked again.
+MIN_WORD_LEN       = 3                  # Shortest word the computer will choose.
+DIFFICULTIES       = ["easy", "medium", "hard"] # Difficulty buckets, from least to most letter entropy.
+SOLVER_LETTERS     = "abcdefghijklmnopqrstuvwxyz" # Letters the solver can guess.
+SOLVER_MAX_LEN     = 64                 # Longest word the solver knows. (Positions fit in 64 bits.)
+LETTER_FREQUENCY   = "etaoinshrdlcumwfgypbvkjxqz" # English letters, most common first.
+SIM_BATCH_SIZE     = 500                # Games per simulator task.
+SERVER_IDLE_TIMEOUT = 300.0             # Seconds a session can be idle before it is closed.
+SERVER_LINE_LIMIT  = 256                # Longest line a client can send.
+SERVER_WRITE_HIGH  = 16 * 1024          # Bytes buffered for a client before writes wait for it.
+SERVER_BACKLOG     = 1024               # Connections waiting to be accepted.
+
+# Worker state for the simulator, set once per process.
+sim_index      = None
+sim_strategies = {}
 
 # Downloads the word list.
 # * wordlist_dl_url -> A string containing the URL of the wordlist file.
@@ -42,54 +90,837 @@ def wordlist_download(wordlist_dl_url):
     wordlist_file = urlopen(wordlist_dl_url)
 
     # Add each line to the wordlist list.
-    for line in wordlist_file:
-        # We need to strip first 2 characters, and last three, as the
-        # file's lines are in the form: b'<WORD HERE>\n'
-        wordlist_data.append(str(line)[2:-3]) 
+    wordlist_data.extend(wordlist_parse(wordlist_file.read()))
 
 # Read a local wordlist file.
 # * wordlist_file_path -> The path of the file to read.
 def wordlist_readlocal(wordlist_file_path):
     # Read the local file given the path.
-    wordlist_file = open(wordlist_file_path, "rt")
+    with open(wordlist_file_path, "rb") as wordlist_file:
+        # Add each line to the wordlist list.
+        wordlist_data.extend(wordlist_parse(wordlist_file.read()))
 
-    # Add each line to the wordlist list.
-    for line in wordlist_file:
-        wordlist_data.append(str(line).strip("\n"))
+# Split the raw bytes of a word list file into words.
+# Handles UTF-8 and both LF and CRLF line endings, and skips blank lines.
+# * data -> The bytes of the file.
+def wordlist_parse(data):
+    words = []
+    for line in data.decode("utf-8", "replace").splitlines():
+        line = line.strip()
+        if line:
+            words.append(line)
+    return words
+
+# A compiled word list, memory-mapped from its cache file.
+# Words are stored back to back as UTF-8 in one blob, with an
+# array of offsets into it, so opening one costs almost nothing,
+# and a word is only decoded when it is used.
+# It behaves like a read-only list of strings.
+class wordlist_store:
+    # Constructor.
+    # * cache_path -> The path of the compiled word list.
+    def __init__(self, cache_path):
+        self.offsets = self.blob = None
+        self.cache_file = open(cache_path, "rb")
+        try:
+            self.cache_map = mmap.mmap(self.cache_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.cache_file.close()
+            raise ValueError("'{}' is not a compiled word list".format(cache_path))
+        header_size = struct.calcsize(WORDLIST_HEADER)
+        if len(self.cache_map) < header_size:
+            self.close()
+            raise ValueError("'{}' is not a compiled word list".format(cache_path))
+        magic, version, self.mtime, self.size, self.sha256, self.count, blob_len = \
+            struct.unpack_from(WORDLIST_HEADER, self.cache_map)
+        if magic != WORDLIST_MAGIC or version != WORDLIST_VERSION:
+            self.close()
+            raise ValueError("'{}' is not a compiled word list".format(cache_path))
+        blob_start = header_size + 4 * (self.count + 1)
+        if len(self.cache_map) < blob_start + blob_len:
+            self.close()
+            raise ValueError("'{}' is truncated".format(cache_path))
+        view = memoryview(self.cache_map)
+        self.offsets = view[header_size:blob_start].cast("I")
+        self.blob = view[blob_start:blob_start + blob_len]
+        view.release()
+        if self.offsets[0] != 0 or self.offsets[self.count] != blob_len:
+            self.close()
+            raise ValueError("'{}' is corrupt".format(cache_path))
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("word index out of range")
+        return str(self.blob[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+
+    # Unmap and close the cache file.
+    def close(self):
+        if self.offsets is not None:
+            self.offsets.release()
+            self.blob.release()
+        self.cache_map.close()
+        self.cache_file.close()
+
+# Write a compiled word list.
+# * cache_path -> The path to write to.
+# * words      -> The list of words.
+# * mtime      -> The source's modification time in ns. (For URLs, when it was downloaded.)
+# * size       -> The source's size in bytes.
+# * sha256     -> The SHA-256 digest of the source.
+def wordlist_compile(cache_path, words, mtime, size, sha256):
+    blob = bytearray()
+    offsets = array.array("I", [0])
+    for word in words:
+        blob += word.encode("utf-8")
+        offsets.append(len(blob))
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(struct.pack(WORDLIST_HEADER, WORDLIST_MAGIC, WORDLIST_VERSION, mtime, size, sha256, len(words), len(blob)))
+        f.write(offsets.tobytes())
+        f.write(blob)
+    os.replace(tmp_path, cache_path)
+
+# Load a word list through the cache. A local file's cache is
+# used while the file's time and size are unchanged, or while
+# its hash is, if only its time changed. A URL's cache keeps the
+# time it was downloaded, and is used until it is older than
+# 'max_age', or 'refresh' is set; even then, the cache is used if
+# the download fails, so games can still start offline.
+# Returns a wordlist_store.
+# * source  -> A local path or an http(s) URL.
+# * refresh -> Download a URL's list again, and rebuild the cache if it changed.
+# * max_age -> Seconds a URL's cache is used before it is downloaded again.
+def wordlist_load(source, refresh=False, max_age=WORDLIST_MAX_AGE):
+    is_url = source.startswith("http://") or source.startswith("https://")
+    key = source if is_url else os.path.abspath(source)
+    cache_path = os.path.join(WORDLIST_CACHE_DIR, hashlib.sha256(key.encode("utf-8")).hexdigest()[:32] + ".bin")
+
+    # Open the old cache, if there is a usable one.
+    store = None
+    try:
+        store = wordlist_store(cache_path)
+    except (FileNotFoundError, ValueError):
+        pass
+
+    if is_url:
+        if store is not None and not refresh and time.time_ns() - store.mtime < max_age * 1e9:
+            return store
+        try:
+            data = urlopen(source).read()
+        except OSError:
+            if store is not None:
+                return store
+            raise
+        mtime, size = time.time_ns(), len(data)
+    else:
+        stat = os.stat(source)
+        if store is not None and store.mtime == stat.st_mtime_ns and store.size == stat.st_size:
+            return store
+        with open(source, "rb") as f:
+            data = f.read()
+        mtime, size = stat.st_mtime_ns, stat.st_size
+
+    # Rebuild the cache, unless the content is the same as before.
+    sha256 = hashlib.sha256(data).digest()
+    words = wordlist_store_words(store) if store is not None and store.sha256 == sha256 else wordlist_parse(data)
+    if store is not None:
+        store.close()
+    wordlist_compile(cache_path, words, mtime, size, sha256)
+    return wordlist_store(cache_path)
+
+# Get every word of a word list store as a list.
+# * store -> The wordlist_store.
+def wordlist_store_words(store):
+    return [store[i] for i in range(len(store))]
+
+# Get the Shannon entropy of a word's letters, in bits. Words
+# with more distinct letters have more entropy, and take more
+# guesses to find, so this is used as their difficulty.
+# * word -> The word.
+def word_entropy(word):
+    counts = {}
+    for ltr in word:
+        counts[ltr] = counts.get(ltr, 0) + 1
+    n = len(word)
+    return -sum(c / n * math.log2(c / n) for c in counts.values())
+
+# An index of a word list, bucketed by length and difficulty, so
+# a random word can be picked in O(1) with no retries.
+# For each difficulty (and for all words together), the word ids
+# are sorted by length, with the position each length starts at,
+# so any range of lengths is one contiguous slice.
+class word_index:
+    # Constructor. Words shorter than MIN_WORD_LEN are left out.
+    # * words -> A list (or wordlist_store) of words.
+    def __init__(self, words):
+        self.words = []
+        for w in words:
+            if len(w) >= MIN_WORD_LEN:
+                self.words.append(w.lower())
+        self.max_len = max((len(w) for w in self.words), default=0)
+
+        # Split the words into equal thirds by entropy.
+        by_entropy = sorted(range(len(self.words)), key=lambda i: word_entropy(self.words[i]))
+        third = len(by_entropy) / len(DIFFICULTIES)
+        buckets = { None: by_entropy }
+        for d, name in enumerate(DIFFICULTIES):
+            buckets[name] = by_entropy[int(d * third):int((d + 1) * third)]
+
+        # Sort each bucket by length, and find where each length starts.
+        self.ids = {}
+        self.starts = {}
+        for name, ids in buckets.items():
+            ids = sorted(ids, key=lambda i: len(self.words[i]))
+            starts = [0] * (self.max_len + 2)
+            for i in ids:
+                starts[len(self.words[i]) + 1] += 1
+            for n in range(1, self.max_len + 2):
+                starts[n] += starts[n - 1]
+            self.ids[name] = ids
+            self.starts[name] = starts
+
+    # Count the words matching a length range and difficulty.
+    # * min_len    -> The shortest length allowed.
+    # * max_len    -> The longest length allowed. (None for no limit)
+    # * difficulty -> One of DIFFICULTIES, or None for any.
+    def count(self, min_len=MIN_WORD_LEN, max_len=None, difficulty=None):
+        lo, hi = self.slice(min_len, max_len, difficulty)
+        return hi - lo
+
+    # Find the slice of a bucket's ids matching a length range.
+    def slice(self, min_len, max_len, difficulty):
+        if difficulty is not None and difficulty not in DIFFICULTIES:
+            raise ValueError("unknown difficulty '{}'".format(difficulty))
+        starts = self.starts[difficulty]
+        min_len = min(max(min_len, 0), self.max_len + 1)
+        max_len = self.max_len if max_len is None else min(max_len, self.max_len)
+        if max_len < min_len:
+            return (0, 0)
+        return (starts[min_len], starts[max_len + 1])
+
+    # Pick a random word matching a length range and difficulty.
+    # Raises ValueError if no word matches.
+    # * min_len    -> The shortest length allowed.
+    # * max_len    -> The longest length allowed. (None for no limit)
+    # * difficulty -> One of DIFFICULTIES, or None for any.
+    # * rng        -> The random.Random to use. (Defaults to the random module.)
+    def pick(self, min_len=MIN_WORD_LEN, max_len=None, difficulty=None, rng=random):
+        lo, hi = self.slice(min_len, max_len, difficulty)
+        if hi <= lo:
+            raise ValueError("no words of length {}-{} and difficulty '{}'".format(
+                min_len, "any" if max_len is None else max_len, difficulty or "any"))
+        return self.words[self.ids[difficulty][rng.randrange(lo, hi)]]
 
 # Select a random word from the word list.
-def word_rand_select():
-    # We try 15 times until we get a word long enough.
-    for i in range(0, 15):
-        # Generate a random index between zero and wordlist size.
-        w = wordlist_data[random.randrange(0, len(wordlist_data))]
-
-        # Check if length is less than 3. If it is, try again.
-        if len(w) < 3:
-            continue
-            
-        # Else just return our word.
-        return w.lower()
+# * min_len    -> The shortest length allowed.
+# * max_len    -> The longest length allowed. (None for no limit)
+# * difficulty -> One of DIFFICULTIES, or None for any.
+def word_rand_select(min_len=MIN_WORD_LEN, max_len=None, difficulty=None):
+    # Build the index the first time it's needed.
+    global wordlist_index
+    if wordlist_index is None:
+        wordlist_index = word_index(wordlist_data)
+    return wordlist_index.pick(min_len, max_len, difficulty)
+
+# Parse a length range from the command line, like '6-9' or '7'.
+# * s -> The string to parse.
+def parse_length_range(s):
+    if "-" in s:
+        lo, hi = s.split("-", 1)
+        return (int(lo) if lo else MIN_WORD_LEN, int(hi) if hi else None)
+    return (int(s), int(s))
+
+# A computer guesser. It keeps the words still consistent with
+# the guesses so far, and picks the letter that leaves the
+# fewest candidates on average.
+# Every word has a bitmask per letter of the positions it is
+# at, so a guess filters the candidates by comparing masks, and
+# scoring a letter is counting how many candidates share each
+# mask, with no string scans.
+class hangman_solver:
+    # Constructor. Only words made of SOLVER_LETTERS are kept.
+    # * words -> A list (or wordlist_store) of words.
+    def __init__(self, words):
+        by_len = {}
+        for w in words:
+            w = w.lower()
+            if len(w) <= SOLVER_MAX_LEN and w and all(ltr in SOLVER_LETTERS for ltr in w):
+                by_len.setdefault(len(w), set()).add(w)
+
+        # For each length, the words and their position masks.
+        # With numpy the masks are a (words, 26) matrix; without it,
+        # a list of 26 lists.
+        self.words = {}
+        self.masks = {}
+        for n, group in by_len.items():
+            group = sorted(group)
+            masks = [[0] * len(group) for ltr in SOLVER_LETTERS]
+            for i, w in enumerate(group):
+                for pos, ltr in enumerate(w):
+                    masks[ord(ltr) - 97][i] |= 1 << pos
+            if numpy is not None:
+                masks = numpy.array(masks, dtype=numpy.uint64).T.copy()
+            self.words[n] = group
+            self.masks[n] = masks
+        self.openings = {} # The best first letter for each length.
+        self.new_game(0)
+
+    # Start a new game.
+    # * length -> The length of the hidden word.
+    def new_game(self, length):
+        self.length = length
+        self.guessed = set()
+        count = len(self.words.get(length, ()))
+        if numpy is not None:
+            self.cand = numpy.arange(count)
+        else:
+            self.cand = list(range(count))
+
+    # Get the position mask of a letter in a pattern.
+    # * pattern -> The letters found so far, with '_' for blanks.
+    # * ltr     -> The letter.
+    def pattern_mask(self, pattern, ltr):
+        mask = 0
+        for pos, c in enumerate(pattern):
+            if c == ltr:
+                mask |= 1 << pos
+        return mask
+
+    # Narrow the candidates after a guess.
+    # * ltr  -> The letter guessed.
+    # * mask -> The positions it was found at. (0 if it was not in the word.)
+    def observe(self, ltr, mask):
+        self.guessed.add(ltr)
+        if ltr not in SOLVER_LETTERS or len(self.cand) == 0:
+            return
+        col = self.masks[self.length][:, ord(ltr) - 97] if numpy is not None else self.masks[self.length][ord(ltr) - 97]
+        if numpy is not None:
+            self.cand = self.cand[col[self.cand] == numpy.uint64(mask)]
+        else:
+            self.cand = [i for i in self.cand if col[i] == mask]
+
+    # Start over from a game in progress.
+    # * word_totalguessed -> The letters found so far, with '_' for blanks.
+    # * word_excludes     -> The letters known not to be in the word.
+    def sync(self, word_totalguessed, word_excludes):
+        self.new_game(len(word_totalguessed))
+        for ltr in set(word_totalguessed) - {"_"}:
+            self.observe(ltr, self.pattern_mask(word_totalguessed, ltr))
+        for ltr in word_excludes:
+            self.observe(ltr, 0)
+
+    # Get the words still consistent with the guesses.
+    def candidates(self):
+        group = self.words.get(self.length, [])
+        return [group[i] for i in self.cand]
+
+    # Score every letter by the expected number of candidates
+    # left after guessing it (the sum of squared partition sizes
+    # over the count), and the number of candidates it would
+    # miss. Lower is better on both. Returns a list of
+    # (expected, misses) in SOLVER_LETTERS order.
+    def scores(self):
+        n = len(self.cand)
+        if numpy is not None:
+            # Sort each letter's column, so equal masks are runs.
+            # Then the run lengths are the partition sizes.
+            sub = self.masks[self.length][self.cand]
+            runs = numpy.sort(sub, axis=0).T
+            starts = numpy.ones(runs.shape, dtype=bool)
+            starts[:, 1:] = runs[:, 1:] != runs[:, :-1]
+            starts = numpy.flatnonzero(starts)
+            sizes = numpy.diff(numpy.append(starts, runs.size)).astype(numpy.float64)
+            sum_sq = numpy.bincount(starts // n, weights=sizes * sizes, minlength=len(SOLVER_LETTERS))
+            misses = numpy.count_nonzero(sub == 0, axis=0)
+            return [(float(sum_sq[i]) / n, int(misses[i])) for i in range(len(SOLVER_LETTERS))]
+        result = []
+        for col in self.masks[self.length]:
+            sizes = {}
+            for i in self.cand:
+                sizes[col[i]] = sizes.get(col[i], 0) + 1
+            result.append((sum(c * c for c in sizes.values()) / n, sizes.get(0, 0)))
+        return result
+
+    # Pick the best letter to guess next. Returns None if no
+    # candidates are left, or every letter has been guessed.
+    def best_letter(self):
+        if len(self.cand) == 0:
+            return None
+        # The first guess only depends on the length, so it's kept.
+        if not self.guessed and self.length in self.openings:
+            return self.openings[self.length]
+        best = None
+        best_score = None
+        for ltr, score in zip(SOLVER_LETTERS, self.scores()):
+            if ltr in self.guessed:
+                continue
+            if best_score is None or score < best_score:
+                best = ltr
+                best_score = score
+        if not self.guessed:
+            self.openings[self.length] = best
+        return best
+
+# The state of one game of Hangman, without any input or output,
+# so it can be played by a person or by a strategy.
+class hangman_game:
+    # Many games can be kept at once by the server, so they're kept small.
+    __slots__ = ("word", "found", "excludes", "guessed", "health", "guesses", "won", "lost")
+
+    # Constructor.
+    # * word -> The word to guess.
+    def __init__(self, word):
+        self.word = word
+        self.found = ["_"] * len(word) # The letters found so far.
+        self.excludes = []              # Letters that aren't in the word.
+        self.guessed = set()            # Every letter guessed.
+        self.health = 100
+        self.guesses = 0                # The number of guesses made.
+        self.won = False
+        self.lost = False
+
+    # Whether the game has finished.
+    def over(self):
+        return self.won or self.lost
+
+    # Make a guess. This can be the whole word, or else just its
+    # first character is used. Returns whether the guess was in
+    # the word.
+    # * inp_string -> The guess.
+    def guess(self, inp_string):
+        self.guesses += 1
+
+        # Check if the user guessed the entire word correctly.
+        if inp_string == self.word:
+            self.found = list(self.word)
+            self.won = True
+            return True
+
+        # We will just use the first char.
+        char_guessed = inp_string.lower()[0]
+        self.guessed.add(char_guessed)
+        if char_guessed in self.word:
+            # Replace the found string's underscores with the letter.
+            for ltr_idx, ltr in enumerate(self.word):
+                if ltr == char_guessed:
+                    self.found[ltr_idx] = char_guessed
+            if not "_" in self.found:
+                self.won = True
+            return True
+
+        # Add to known letters that aren't in the word.
+        if not char_guessed in self.excludes:
+            self.excludes.append(char_guessed)
+
+        # Decrement health.
+        self.health -= HEALTH_DECREMENT
+        if self.health <= 0:
+            self.lost = True
+        return False
+
+# A strategy that guesses random letters.
+class strategy_random:
+    def __init__(self, words):
+        pass
+
+    # Start a new game.
+    # * game -> The hangman_game.
+    # * rng  -> The random.Random for this game.
+    def start(self, game, rng):
+        self.order = list(SOLVER_LETTERS)
+        rng.shuffle(self.order)
+
+    # Pick the next letter to guess.
+    # * game -> The hangman_game.
+    def guess(self, game):
+        for ltr in self.order:
+            if ltr not in game.guessed:
+                return ltr
+        return None
+
+    # Learn the result of a guess.
+    # * game -> The hangman_game.
+    # * ltr  -> The letter guessed.
+    def update(self, game, ltr):
+        pass
+
+# A strategy that guesses letters from most to least common.
+class strategy_frequency(strategy_random):
+    def start(self, game, rng):
+        self.order = LETTER_FREQUENCY
+
+# A strategy that uses the hangman_solver, falling back to
+# letter frequency when the word isn't one the solver knows.
+class strategy_solver(strategy_frequency):
+    def __init__(self, words):
+        self.solver = hangman_solver(words)
+
+    def start(self, game, rng):
+        strategy_frequency.start(self, game, rng)
+        self.solver.new_game(len(game.word))
+
+    def guess(self, game):
+        ltr = self.solver.best_letter()
+        if ltr is None:
+            ltr = strategy_frequency.guess(self, game)
+        return ltr
+
+    def update(self, game, ltr):
+        self.solver.observe(ltr, self.solver.pattern_mask(game.found, ltr))
+
+STRATEGIES = {
+    "random": strategy_random,
+    "frequency": strategy_frequency,
+    "solver": strategy_solver,
+}
+
+# Play one game with a strategy until it is won or lost.
+# Returns the finished hangman_game.
+# * strategy -> The strategy object.
+# * word     -> The word to guess.
+# * rng      -> The random.Random for this game.
+def play_game(strategy, word, rng):
+    game = hangman_game(word)
+    strategy.start(game, rng)
+    while not game.over():
+        ltr = strategy.guess(game)
+        if ltr is None:
+            # Nothing left to guess, so the word can't be found.
+            game.lost = True
+            break
+        game.guess(ltr)
+        strategy.update(game, ltr)
+    return game
+
+# Set up a simulator process. The index and strategies are only
+# built once per process, not for every batch.
+# * words -> The words to play with.
+# * names -> The names of the strategies, from STRATEGIES.
+def sim_init(words, names):
+    global sim_index, sim_strategies
+    sim_index = word_index(words)
+    sim_strategies = { name: STRATEGIES[name](sim_index.words) for name in names }
+
+# Play a batch of simulated games. Each game has its own random
+# generator seeded from the seed and game number, so the result
+# doesn't depend on how games are split between processes.
+# Returns [wins, guesses, misses].
+# * name       -> The name of the strategy, from STRATEGIES.
+# * seed       -> The simulator seed.
+# * first      -> The number of the first game.
+# * count      -> The number of games to play.
+# * min_len    -> The shortest word length.
+# * max_len    -> The longest word length. (None for no limit)
+# * difficulty -> One of DIFFICULTIES, or None for any.
+def sim_batch(name, seed, first, count, min_len, max_len, difficulty):
+    strategy = sim_strategies[name]
+    totals = [0, 0, 0]
+    for g in range(first, first + count):
+        rng = random.Random("{}:{}".format(seed, g))
+        game = play_game(strategy, sim_index.pick(min_len, max_len, difficulty, rng), rng)
+        totals[0] += game.won
+        totals[1] += game.guesses
+        totals[2] += len(game.excludes)
+    return totals
+
+# Simulate games with each strategy and report the results.
+# Every strategy plays the same words, so they can be compared.
+# Returns a list of (name, games, wins, guesses, misses, seconds).
+# * words      -> The words to play with.
+# * names      -> The names of the strategies, from STRATEGIES.
+# * games      -> The number of games per strategy.
+# * seed       -> The simulator seed.
+# * jobs       -> The number of processes.
+# * min_len    -> The shortest word length.
+# * max_len    -> The longest word length. (None for no limit)
+# * difficulty -> One of DIFFICULTIES, or None for any.
+def simulate(words, names, games, seed=0, jobs=1, min_len=MIN_WORD_LEN, max_len=None, difficulty=None):
+    batches = [(first, min(SIM_BATCH_SIZE, games - first)) for first in range(0, games, SIM_BATCH_SIZE)]
+    pool = None
+    if jobs > 1:
+        # Start every process before timing, so their set-up isn't counted.
+        pool = ProcessPoolExecutor(jobs, initializer=sim_init, initargs=(list(words), names))
+        list(pool.map(time.sleep, [0.1] * jobs))
+    else:
+        sim_init(words, names)
+    results = []
+    try:
+        for name in names:
+            start = time.perf_counter()
+            if pool is None:
+                parts = [sim_batch(name, seed, first, count, min_len, max_len, difficulty) for first, count in batches]
+            else:
+                futures = [pool.submit(sim_batch, name, seed, first, count, min_len, max_len, difficulty) for first, count in batches]
+                parts = [future.result() for future in futures]
+            seconds = time.perf_counter() - start
+            wins, guesses, misses = [sum(part[i] for part in parts) for i in range(3)]
+            results.append((name, games, wins, guesses, misses, seconds))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return results
+
+# The state of one client of the server.
+class hangman_session:
+    __slots__ = ("game", "games", "wins")
+
+    def __init__(self):
+        self.game = None
+        self.games = 0
+        self.wins = 0
+
+# Get the server's reply to one line from a client, and update
+# its session. Returns the reply line, or None to close.
+# The commands are a letter or word to guess, NEW and QUIT.
+# The replies are:
+#   NEW <found>              A new game has started.
+#   HIT <found> <health>     The guess was in the word.
+#   MISS <found> <health>    The guess wasn't in the word.
+#   WIN <word> <health>      The word has been found.
+#   LOSE <word>              The player has run out of health.
+#   ERR <message>            The command wasn't understood.
+# * session    -> The hangman_session.
+# * cmd        -> The line from the client, stripped.
+# * min_len    -> The shortest word length.
+# * max_len    -> The longest word length. (None for no limit)
+# * difficulty -> One of DIFFICULTIES, or None for any.
+def session_reply(session, cmd, min_len=MIN_WORD_LEN, max_len=None, difficulty=None):
+    if cmd == "QUIT":
+        return None
+    if cmd == "NEW":
+        session.game = hangman_game(wordlist_index.pick(min_len, max_len, difficulty))
+        session.games += 1
+        return "NEW {}\n".format("".join(session.game.found))
+    game = session.game
+    if len(cmd) < 1:
+        return "ERR enter a letter\n"
+    if game is None or game.over():
+        return "ERR no game, send NEW\n"
+    hit = game.guess(cmd)
+    if game.won:
+        session.wins += 1
+        return "WIN {} {:g}\n".format(game.word, game.health)
+    if game.lost:
+        return "LOSE {}\n".format(game.word)
+    return "{} {} {:g}\n".format("HIT" if hit else "MISS", "".join(game.found), game.health)
+
+# Serve one client until it quits, disconnects or goes idle.
+# Every reply waits for the client to take it (drain), so a slow
+# client only holds up its own session, and the server never
+# buffers more than SERVER_WRITE_HIGH bytes for it.
+# * reader       -> The client's asyncio.StreamReader.
+# * writer       -> The client's asyncio.StreamWriter.
+# * idle_timeout -> Seconds to wait for the client to read or send.
+# * min_len      -> The shortest word length.
+# * max_len      -> The longest word length. (None for no limit)
+# * difficulty   -> One of DIFFICULTIES, or None for any.
+async def session_handle(reader, writer, idle_timeout=SERVER_IDLE_TIMEOUT, min_len=MIN_WORD_LEN, max_len=None, difficulty=None):
+    writer.transport.set_write_buffer_limits(high=SERVER_WRITE_HIGH)
+    session = hangman_session()
+    reply = session_reply(session, "NEW", min_len, max_len, difficulty)
+    try:
+        while reply is not None:
+            writer.write(reply.encode())
+            await asyncio.wait_for(writer.drain(), idle_timeout)
+            line = await asyncio.wait_for(reader.readline(), idle_timeout)
+            if not line:
+                break
+            reply = session_reply(session, line.decode("utf-8", "replace").strip(), min_len, max_len, difficulty)
+    except asyncio.TimeoutError:
+        # Tell the client why, if it's still listening.
+        writer.write(b"ERR idle\n")
+    except (ValueError, ConnectionError):
+        # The line was too long, or the client went away.
+        pass
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+# Raise the open file limit as far as allowed, so there can be a
+# socket for every client.
+def raise_file_limit():
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+# Start a server. Every session shares the one word index.
+# Returns the asyncio server.
+# * host         -> The address to listen on.
+# * port         -> The port to listen on. (0 for any free port)
+# * idle_timeout -> Seconds a session can be idle.
+# * min_len      -> The shortest word length.
+# * max_len      -> The longest word length. (None for no limit)
+# * difficulty   -> One of DIFFICULTIES, or None for any.
+async def server_start(host, port, idle_timeout=SERVER_IDLE_TIMEOUT, min_len=MIN_WORD_LEN, max_len=None, difficulty=None):
+    raise_file_limit()
+    handler = lambda reader, writer: session_handle(reader, writer, idle_timeout, min_len, max_len, difficulty)
+    return await asyncio.start_server(handler, host, port, limit=SERVER_LINE_LIMIT, backlog=SERVER_BACKLOG)
+
+# Run a server until it is interrupted.
+# Arguments are the same as server_start().
+async def serve(host, port, idle_timeout=SERVER_IDLE_TIMEOUT, min_len=MIN_WORD_LEN, max_len=None, difficulty=None):
+    server = await server_start(host, port, idle_timeout, min_len, max_len, difficulty)
+    for sock in server.sockets:
+        print("  (Serving on {}:{})".format(*sock.getsockname()[:2]))
+    async with server:
+        await server.serve_forever()
+
+# One load test client. It connects, waits for every client to
+# be connected, then guesses letters in frequency order (starting
+# a new game after each one ends) until the time is up.
+# * host      -> The server's address.
+# * port      -> The server's port.
+# * connected -> A list each client appends to once connected.
+# * go        -> An asyncio.Event set when every client is connected.
+# * deadline  -> The time.perf_counter() to stop at.
+# * latencies -> A list the time of every guess is added to.
+async def load_client(host, port, connected, go, deadline, latencies):
+    reader, writer = await asyncio.open_connection(host, port, limit=SERVER_LINE_LIMIT)
+    try:
+        reply = await reader.readline()
+        connected.append(True)
+        await go.wait()
+        ltr_idx = 0
+        while time.perf_counter() < deadline[0]:
+            if reply.startswith((b"WIN", b"LOSE")):
+                cmd = "NEW"
+                ltr_idx = 0
+            else:
+                cmd = LETTER_FREQUENCY[ltr_idx]
+                ltr_idx += 1
+            start = time.perf_counter()
+            writer.write(cmd.encode() + b"\n")
+            await writer.drain()
+            reply = await reader.readline()
+            if not reply:
+                break
+            latencies.append(time.perf_counter() - start)
+        writer.write(b"QUIT\n")
+    finally:
+        writer.close()
+
+# Load test a server with many connections at once.
+# If port is 0, a server is started in this process on a free port.
+# Returns (requests, seconds, p50, p99), the times in seconds.
+# * host        -> The server's address.
+# * port        -> The server's port. (0 to start one here)
+# * connections -> The number of connections.
+# * duration    -> Seconds to run for, once connected.
+async def load_test(host, port, connections, duration):
+    raise_file_limit()
+    server = None
+    if port == 0:
+        server = await server_start(host, 0)
+        port = server.sockets[0].getsockname()[1]
+    connected = []
+    latencies = []
+    go = asyncio.Event()
+    deadline = [0.0]
+    clients = [asyncio.ensure_future(load_client(host, port, connected, go, deadline, latencies)) for i in range(connections)]
+    try:
+        # Wait for every client to connect before timing.
+        while len(connected) < connections:
+            if any(c.done() for c in clients):
+                # Let a failed connection raise its error.
+                for c in clients:
+                    if c.done():
+                        c.result()
+            await asyncio.sleep(0.01)
+        start = time.perf_counter()
+        deadline[0] = start + duration
+        go.set()
+        await asyncio.gather(*clients)
+        seconds = time.perf_counter() - start
+    finally:
+        for c in clients:
+            c.cancel()
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+    latencies.sort()
+    if not latencies:
+        return (0, seconds, 0.0, 0.0)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)]
+    return (len(latencies), seconds, p50, p99)
 
 # The main method. This is called once when the program is executed.
 # * args -> The command-line arguments passed into the program 
 def main_func(args):
+    parser = argparse.ArgumentParser(description="A game of Hangman.")
+    parser.add_argument("wordlist", nargs="?", help="local word list to use instead of the online one")
+    parser.add_argument("--refresh-wordlist", action="store_true", help="download the online word list again, even if its cache is recent")
+    parser.add_argument("--length", default="{}-".format(MIN_WORD_LEN), metavar="MIN-MAX", help="length of words to pick, e.g. 6-9")
+    parser.add_argument("--difficulty", choices=DIFFICULTIES, help="difficulty of words to pick")
+    parser.add_argument("--hint", action="store_true", help="show the solver's best guess each turn")
+    parser.add_argument("--simulate", type=int, metavar="GAMES", help="play GAMES games with each strategy and report the results")
+    parser.add_argument("--strategy", action="append", choices=sorted(STRATEGIES), help="strategy to simulate (can be repeated, default all)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the simulator")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="processes for the simulator")
+    parser.add_argument("--serve", action="store_true", help="run a multiplayer server")
+    parser.add_argument("--load-test", type=int, metavar="CONNECTIONS", help="load test a server with CONNECTIONS clients")
+    parser.add_argument("--host", default="127.0.0.1", help="address of the server")
+    parser.add_argument("--port", type=int, default=0, help="port of the server (0 with --load-test starts one locally)")
+    parser.add_argument("--idle-timeout", type=float, default=SERVER_IDLE_TIMEOUT, help="seconds before idle sessions are closed")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run the load test for")
+    opts = parser.parse_args(args[1:])
+    try:
+        min_len, max_len = parse_length_range(opts.length)
+    except ValueError:
+        parser.error("invalid length range '{}'".format(opts.length))
+
     print("-- -- Hangman -- --")
 
-    # First we retrieve a word list.
-    wordlist_local = len(args) > 1
+    # First we retrieve a word list. It is only read (or downloaded)
+    #   when its cache is missing or out of date.
+    global wordlist_data, wordlist_index
+    wordlist_local = opts.wordlist is not None
     if not wordlist_local:
-        print("  (Downloading word list, please wait...)")
-
-        # Download the word list.
-        wordlist_download(wordlist_file_url)
-        wordlist_local = False
+        print("  (Loading word list, please wait...)")
+        wordlist_data = wordlist_load(wordlist_file_url, opts.refresh_wordlist)
     else:
         print("  (Using local word list.)")
+        wordlist_data = wordlist_load(opts.wordlist)
+    wordlist_index = word_index(wordlist_data)
+    if wordlist_index.count(min_len, max_len, opts.difficulty) == 0:
+        print("No words in the list match that length and difficulty.")
+        return
+
+    # Serve many players over the network, if asked to.
+    if opts.serve:
+        try:
+            asyncio.run(serve(opts.host, opts.port, opts.idle_timeout, min_len, max_len, opts.difficulty))
+        except KeyboardInterrupt:
+            pass
+        return
+    if opts.load_test is not None:
+        count, seconds, p50, p99 = asyncio.run(load_test(opts.host, opts.port, opts.load_test, opts.duration))
+        print("  {} connections, {} guesses in {:.2f}s".format(opts.load_test, count, seconds))
+        print("  {:.0f} guesses/sec, p50 {:.2f}ms, p99 {:.2f}ms".format(count / seconds if seconds else 0, p50 * 1000, p99 * 1000))
+        return
 
-        # Read a local file.
-        wordlist_readlocal(args[1])
-        wordlist_local = True
+    # Simulate games instead of playing, if asked to.
+    if opts.simulate is not None:
+        names = opts.strategy or list(STRATEGIES)
+        results = simulate(wordlist_index.words, names, opts.simulate, opts.seed, opts.jobs, min_len, max_len, opts.difficulty)
+        print("  {:<10} {:>8} {:>9} {:>9} {:>9} {:>11}".format("strategy", "games", "win rate", "guesses", "misses", "games/sec"))
+        for name, games, wins, guesses, misses, seconds in results:
+            print("  {:<10} {:>8} {:>8.2%} {:>9.2f} {:>9.2f} {:>11.0f}".format(
+                name, games, wins / games, guesses / games, misses / games, games / seconds if seconds else 0))
+        return
+
+    solver = hangman_solver(wordlist_index.words) if opts.hint else None
 
     # Main game loop. Run every single round.
     round_idx = 0
@@ -97,64 +928,30 @@ def main_func(args):
         print("\n-- -- Hangman Round", round_idx, "-- --")
 
         # Select a random word.
-        word_selected = word_rand_select()
+        word_selected = word_rand_select(min_len, max_len, opts.difficulty)
         print("The computer has chosen a word. Type a letter you think is in the word.")
 
-        # Set the guessed word to blanks.
-        word_totalguessed = ["_"] * len(word_selected)
-
-        # All letters that are not in the word.
-        word_excludes = []
+        # The state of this round.
+        game = hangman_game(word_selected)
 
-        # User's health
-        health = 100
-
-        # Check if the "guessed" string contains an underscore. If it
-        #   doesn't then the user found all the letters.
-        # If it does then the user still has letters to find so we keep running.
-        lost = False
-        while "_" in word_totalguessed:
-            print("  [Found] :", "".join(word_totalguessed))
-            if len(word_excludes) > 0:
-                print("  [Doesn't contain]: " + ", ".join(word_excludes))
-            print("  [Health]:", health)
+        # Keep playing until the user has found all the letters, or
+        #   run out of health.
+        while not game.over():
+            print("  [Found] :", "".join(game.found))
+            if len(game.excludes) > 0:
+                print("  [Doesn't contain]: " + ", ".join(game.excludes))
+            print("  [Health]:", game.health)
+            if solver is not None:
+                solver.sync(game.found, game.excludes)
+                print("  [Hint]  :", solver.best_letter(), "(" + str(len(solver.cand)), "words left)")
 
             # Get the user's input.
             inp_string = str(input())
             while len(inp_string) < 1:
                 inp_string = str(input("Enter a letter.\n"))
-            # Check if user guessed entire word correctly.
-            if inp_string == word_totalguessed:
-                lost = False
-                break;
-            # We will just use the first char.
-            char_guessed = inp_string.lower()[0]
-
-            # Whether the letter is in the word.
-            ltr_in_word = char_guessed in word_selected  
-            if ltr_in_word:
-                # Iterate over the word, and replace the "guessed" 
-                #   string's underscores with the letter.
-                ltr_idx = -1
-                for ltr in word_selected:
-                    ltr_idx += 1
-                    if not ltr == char_guessed:
-                        # Not this letter, skip to next iteration.
-                        continue
-                    # Set the guessed string at this index to this letter.
-                    word_totalguessed[ltr_idx] = char_guessed
-            else:
-                # Add to known letters that aren't in the word.
-                if not char_guessed in word_excludes:
-                    word_excludes.append(char_guessed)
-                
-                # Decrement health.
-                health -= HEALTH_DECREMENT
-                if health <= 0:
-                    lost = True
-                    break
-        if not lost:
-            print("Congratulations, you guessed all letters of the word '" + word_selected + "' with ", health, "% health remaining.")
+            game.guess(inp_string)
+        if game.won:
+            print("Congratulations, you guessed all letters of the word '" + word_selected + "' with ", game.health, "% health remaining.")
         else:
             print("You lose. The word was '" + word_selected + "'.")
 
@@ -177,4 +974,5 @@ def main_func(args):
 
 
 # Call the main method
-main_func(sys.argv)
\ No newline at end of file
+if __name__ == "__main__":
+    main_func(sys.argv)
\ No newline at end of file
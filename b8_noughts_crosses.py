@@ -9,23 +9,63 @@
 # The values on the grid are stored
 # as integers in a 1D array.
 # (screw ugly 2D arrays...)
+# Each side's pieces are also kept as a
+# bitboard, one bit per cell, so checking
+# for a win is a few ANDs with the masks
+# of every winning line.
+# The grid can be any size, with any
+# number in a row to win (an m,n,k game),
+# set from the command line.
 # -- -- -- -- -- -- -- -- -- -- -- -- --
 
 # Imports
+import sys
+import math
+import time
 import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 
 # Constants
+# The grid size and win length are changed by grid_setup(), along
+# with everything that depends on them.
 GRID_WIDTH     = 3
 GRID_HEIGHT    = 3
+WIN_LENGTH     = 3                     # The number in a row needed to win.
 ID_EMPTY       = 2
 ID_NOUGHTS     = 0
 ID_CROSSES     = 1
 GRID_SYMBOLS   = ["0", "X", " "]
 GRID_HEADER    = "   - 0 - 1 - 2 -"
 GRID_SEPERATOR = "   -------------"
+GRID_CELLS     = GRID_WIDTH * GRID_HEIGHT
+GRID_FULL      = (1 << GRID_CELLS) - 1 # Bitboard with every cell set.
+GRID_MAX_ROWS  = 26                    # Rows are lettered, so there can only be 26.
+SCORE_INF      = GRID_CELLS + 2        # More than any score a position can have.
+AI_PERFECT_MAX_CELLS = 9               # Largest grid the perfect AI can solve.
+MCTS_EXPLORE   = math.sqrt(2)          # How much the tree search explores less-visited moves.
+MCTS_BUDGET    = 1.0                   # Default seconds the tree search thinks for each move.
+TT_EXACT       = 0                     # Transposition table entry flags.
+TT_LOWER       = 1
+TT_UPPER       = 2
+AI_MISTAKES    = { "easy": 0.5, "medium": 0.25, "hard": 0.1, "perfect": 0.0 } # Chance of a random move at each difficulty.
 
 # Global vars
+WIN_MASKS      = []     # The bitboard masks of every winning line.
+CELL_WIN_MASKS = []     # The winning lines through each cell.
+BB_CELLS_TABLE = None   # The cells of every bitboard, on small grids.
+SYMMETRIES     = []     # The image of each cell under each symmetry of the grid.
+CELL_RAYS      = []     # For each cell, the cells out from it in each direction, for array boards.
 grid_vals      = [ID_EMPTY] * (GRID_WIDTH * GRID_HEIGHT) # All values on the grid. Initialised to empty.
+grid_bits      = [0, 0] # Bitboards of the noughts' and crosses' cells, kept in step with grid_vals.
+sym_tables     = None   # For each symmetry, the image of every bitboard. Made on first use.
+tt_table       = {}     # Transposition table of (flag, score), by canonical position.
+tt_moves       = {}     # Scores of every move, by canonical position. Filled by solve_tree().
+mcts_budget    = MCTS_BUDGET # Seconds the tree search thinks for each move.
+mcts_jobs      = 1      # Processes the tree search runs in.
+mcts_pool      = None   # The worker processes, when there is more than one job.
+mcts_root      = None   # The tree from the last search, kept for the next move.
+mcts_root_bits = None   # The bitboards at the root of that tree.
 
 # Score of player and computer.
 score_player = 0
@@ -36,6 +76,7 @@ tie_count = 0
 def draw_grid():
     # Iterate through every cell in the grid.
     s = ""
+    width = len(str(GRID_WIDTH - 1))
     print(GRID_HEADER)
     print(GRID_SEPERATOR)
     for y in range(0, GRID_HEIGHT):
@@ -44,7 +85,7 @@ def draw_grid():
         s = " {} |".format(chr(y + 0x41))
         for x in range(0, GRID_WIDTH):
             symb = GRID_SYMBOLS[grid_vals[y * GRID_WIDTH + x]]
-            s += " {} |".format(symb)
+            s += " {:>{}} |".format(symb, width)
         print(s)
         print(GRID_SEPERATOR)
 
@@ -52,7 +93,7 @@ def draw_grid():
 # it into a grid position.
 # Inputs are written in the format a0, b2, c1, etc,
 # where the letter represents row, and number represents
-# column.
+# column. (Columns can have more than one digit, like a12.)
 def parse_input():
     global grid_vals
     row    = 0
@@ -63,7 +104,7 @@ def parse_input():
             # ord converts ASCII to integer.
             # Subtract 0x61 ('a') to get position in alphabet.
             row = ord(inp[0]) - 0x61;
-            column = int(inp[1])
+            column = int(inp[1:])
         except:
             print("Invalid input.")
             continue
@@ -95,78 +136,501 @@ def ai_random_move():
     # Select a random move that is legal.
     sel = legalmoveindices[random.randrange(0, len(legalmoveindices))]
 
-    # Convert the 1D value to 2D position using some wizard-like sorcery.
-    column = sel % GRID_WIDTH
-    row = int(round((sel - column) / GRID_HEIGHT))
-    #print("sel:", sel, "column:", column, "row:", row)
-
-    # Return list constructed from the position.
-    return [column, row]
+    # Convert the 1D value to 2D position.
+    return pos1d_to_2d(sel)
 
 # Convert a 1D position on the grid to 2D.
 def pos1d_to_2d(i):
     column = i % GRID_WIDTH
-    row = int(round((i - column) / GRID_HEIGHT))
+    row = i // GRID_WIDTH
     return [column, row]
 
 # Generates a move on the board that is either
 # random or a winning move.
 def ai_smart_move(ai_id, player_id):
-    global grid_vals
-
-    # Temporary grid used for checking winning moves.
-    grid_temp = []
-    for j in grid_vals:
-        grid_temp.append(j)
-
-    # First check any moves that are winning moves.
-    for i in range(0, len(grid_vals)):
-        if grid_vals[i] != ID_EMPTY:
-            # Occupied cell, skip.
-            continue
-        # Set this point in a temporary board to be the AI's move.
-        grid_temp[i] = ai_id
-
-        # Check if the solution exists by setting this point to AI's.
-        if find_solution(ai_id, grid_temp):
+    # Check the empty cells in order.
+    for i in bb_cells(bb_empty(grid_bits)):
+        # Check if the AI would win by taking this cell.
+        if bb_wins_at(grid_bits[ai_id] | 1 << i, i):
             # Convert the 1D value to 2D position.
             return pos1d_to_2d(i)
 
         # See if the move can be used by other player to win.
         # If it can the AI will take it.
-        grid_temp[i] = player_id
-        if find_solution(player_id, grid_temp):
+        if bb_wins_at(grid_bits[player_id] | 1 << i, i):
             # Convert pos to 2D and take it.
             return pos1d_to_2d(i)
 
-        # Didn't find solution, reset the grid to old.
-        grid_temp[i] = ID_EMPTY
-
     # No winning moves, pick a random one.
     return ai_random_move()
 
+# Find a move that wins straight away, or else one that stops
+# the other side from winning straight away.
+# Returns the 1D position of the move, or None if there isn't one.
+# * ai_id     -> The ID of the side to move.
+# * player_id -> The ID of the other side.
+def ai_forced_move(ai_id, player_id):
+    empty = bb_cells(bb_empty(grid_bits))
+    for bits in (grid_bits[ai_id], grid_bits[player_id]):
+        for i in empty:
+            if bb_wins_at(bits | 1 << i, i):
+                return i
+    return None
+
+# Check whether a bitboard has a winning line.
+# * bits -> The bitboard of one side.
+def bb_has_win(bits):
+    for m in WIN_MASKS:
+        if bits & m == m:
+            return True
+    return False
+
+# Check whether a bitboard has a winning line through a cell.
+# This is all that needs checking after a move to that cell, and
+# there are at most 4 * WIN_LENGTH lines through it, however big
+# the grid is.
+# * bits -> The bitboard of one side.
+# * i    -> The 1D position of the cell.
+def bb_wins_at(bits, i):
+    for m in CELL_WIN_MASKS[i]:
+        if bits & m == m:
+            return True
+    return False
+
+# Get the bitboard of empty cells.
+# * bits -> The bitboards of both sides.
+def bb_empty(bits):
+    return GRID_FULL & ~(bits[0] | bits[1])
+
+# Get the 1D positions of the cells set in a bitboard, lowest first.
+# * bits -> The bitboard.
+def bb_cells_make(bits):
+    cells = []
+    while bits:
+        low = bits & -bits
+        cells.append(low.bit_length() - 1)
+        bits ^= low
+    return tuple(cells)
+
+# Get the 1D positions of the cells set in a bitboard, lowest first.
+# * bits -> The bitboard.
+def bb_cells(bits):
+    if BB_CELLS_TABLE is not None:
+        return BB_CELLS_TABLE[bits]
+    return bb_cells_make(bits)
+
+# Convert a list grid (like grid_vals) to the bitboards of both sides.
+# * grid -> The list grid.
+def grid_to_bits(grid):
+    bits = [0, 0]
+    for i in range(0, GRID_CELLS):
+        if grid[i] != ID_EMPTY:
+            bits[grid[i]] |= 1 << i
+    return bits
+
+# Make the symmetries of the grid, as the image of each cell
+# under each one. A square grid has 8 (4 rotations, each of them
+# flipped), other grids only have 4 (half turns and flips).
+def symmetries_make():
+    syms = []
+    for rot in range(0, 4):
+        if rot % 2 == 1 and GRID_WIDTH != GRID_HEIGHT:
+            continue
+        for flip in (False, True):
+            perm = []
+            for i in range(0, GRID_CELLS):
+                x, y = pos1d_to_2d(i)
+                if flip:
+                    x = GRID_WIDTH - 1 - x
+                if rot == 1:
+                    x, y = GRID_WIDTH - 1 - y, x
+                elif rot == 2:
+                    x, y = GRID_WIDTH - 1 - x, GRID_HEIGHT - 1 - y
+                elif rot == 3:
+                    x, y = y, GRID_WIDTH - 1 - x
+                perm.append(y * GRID_WIDTH + x)
+            syms.append(perm)
+    return syms
+
+# Get the canonical form of a position: the least of its images
+# under every symmetry, so positions that are the same up to
+# symmetry share one table entry.
+# Returns (key, symmetry used).
+# * me  -> The bitboard of the side to move.
+# * opp -> The bitboard of the other side.
+def canonical(me, opp):
+    global sym_tables
+    if sym_tables is None:
+        sym_tables = []
+        for perm in SYMMETRIES:
+            table = [0] * (GRID_FULL + 1)
+            for bits in range(1, GRID_FULL + 1):
+                low = bits & -bits
+                table[bits] = table[bits ^ low] | 1 << perm[low.bit_length() - 1]
+            sym_tables.append(table)
+    best = None
+    best_sym = 0
+    for sym, table in enumerate(sym_tables):
+        key = table[me] << GRID_CELLS | table[opp]
+        if best is None or key < best:
+            best = key
+            best_sym = sym
+    return (best, best_sym)
+
+# Count the cells set in a bitboard.
+def bb_count(bits):
+    return bin(bits).count("1")
+
+# Search a position with negamax and alpha-beta pruning, using
+# the transposition table. Returns the score for the side to
+# move: 0 for a draw, otherwise the number of cells left empty
+# when the game is won (negative if it is lost), so quicker wins
+# score higher.
+# * me    -> The bitboard of the side to move.
+# * opp   -> The bitboard of the other side.
+# * alpha -> The score the side to move already has elsewhere.
+# * beta  -> The score the other side already has elsewhere.
+def negamax(me, opp, alpha, beta):
+    key = canonical(me, opp)[0]
+    entry = tt_table.get(key)
+    if entry is not None:
+        flag, score = entry
+        if flag == TT_EXACT:
+            return score
+        if flag == TT_LOWER and score >= beta:
+            return score
+        if flag == TT_UPPER and score <= alpha:
+            return score
+
+    empty = bb_empty((me, opp))
+    if empty == 0:
+        return 0
+    alpha_start = alpha
+    best = -SCORE_INF
+    for i in bb_cells(empty):
+        bits = me | 1 << i
+        if bb_wins_at(bits, i):
+            # Winning now is the best score there can be here.
+            best = bb_count(empty)
+            break
+        score = -negamax(opp, bits, -beta, -alpha)
+        if score > best:
+            best = score
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+
+    if best <= alpha_start:
+        tt_table[key] = (TT_UPPER, best)
+    elif best >= beta:
+        tt_table[key] = (TT_LOWER, best)
+    else:
+        tt_table[key] = (TT_EXACT, best)
+    return best
+
+# Get the exact score of every move in a position.
+# Returns a dict of 1D position to score.
+# * me  -> The bitboard of the side to move.
+# * opp -> The bitboard of the other side.
+def move_scores(me, opp):
+    key, sym = canonical(me, opp)
+    perm = SYMMETRIES[sym]
+    scores = tt_moves.get(key)
+    if scores is None:
+        # Score the moves of the canonical position, so the
+        # result can be shared by all of its images.
+        table = sym_tables[sym]
+        cme = table[me]
+        copp = table[opp]
+        empty = bb_empty((cme, copp))
+        scores = {}
+        for i in bb_cells(empty):
+            bits = cme | 1 << i
+            if bb_wins_at(bits, i):
+                scores[i] = bb_count(empty)
+            else:
+                scores[i] = -negamax(copp, bits, -SCORE_INF, SCORE_INF)
+        tt_moves[key] = scores
+    return { i: scores[perm[i]] for i in bb_cells(bb_empty((me, opp))) }
+
+# Solve every position reachable from one, so that the moves of
+# any of them can be looked up without searching.
+# * me  -> The bitboard of the side to move.
+# * opp -> The bitboard of the other side.
+def solve_tree(me=0, opp=0):
+    seen = set()
+    stack = [(me, opp)]
+    while stack:
+        me, opp = stack.pop()
+        key = canonical(me, opp)[0]
+        if key in seen:
+            continue
+        seen.add(key)
+        for i in move_scores(me, opp):
+            bits = me | 1 << i
+            if not bb_wins_at(bits, i) and bb_empty((bits, opp)) != 0:
+                stack.append((opp, bits))
+
+# Generates a move that plays perfectly, except that it plays
+# a random move some of the time, so it can be beaten.
+# The whole game is solved the first time this is called, and
+# after that each move is looked up. On grids too big to solve,
+# ai_mcts_move() is used instead.
+# * ai_id          -> The ID of the AI.
+# * player_id      -> The ID of the player.
+# * mistake_chance -> The chance of playing a random move instead.
+def ai_perfect_move(ai_id, player_id, mistake_chance=0.0):
+    if random.random() < mistake_chance:
+        return ai_random_move()
+    if GRID_CELLS > AI_PERFECT_MAX_CELLS:
+        # Too big to solve, so search it instead.
+        return ai_mcts_move(ai_id, player_id)
+    if not tt_moves:
+        solve_tree()
+    scores = move_scores(grid_bits[ai_id], grid_bits[player_id])
+
+    # Pick randomly between the best moves, so games aren't all the same.
+    best = max(scores.values())
+    return pos1d_to_2d(random.choice([i for i in scores if scores[i] == best]))
+
+# A node of the Monte Carlo search tree: a move, and the results
+# of the playouts that went through it.
+class mcts_node:
+    __slots__ = ("move", "parent", "children", "untried", "wins", "visits", "mover", "winner")
+
+    # Constructor.
+    # * move    -> The 1D position of the move. (None for the root)
+    # * parent  -> The parent node.
+    # * mover   -> The ID of the side that made the move.
+    # * untried -> The empty cells, in random order, not yet expanded.
+    # * winner  -> The ID of the winner if the game is over (ID_EMPTY
+    #              for a tie), or None.
+    def __init__(self, move, parent, mover, untried, winner=None):
+        self.move = move
+        self.parent = parent
+        self.children = []
+        self.untried = untried
+        self.wins = 0.0
+        self.visits = 0
+        self.mover = mover
+        self.winner = winner
+
+# Check whether a side has a line through a cell on an array board,
+# by counting out from the cell in each direction. (O(WIN_LENGTH))
+# * board -> The bytearray of cell IDs.
+# * i     -> The 1D position of the cell.
+# * id    -> The ID of the side.
+def board_wins_at(board, i, id):
+    for fwd, back in CELL_RAYS[i]:
+        count = 1
+        for j in fwd:
+            if board[j] != id:
+                break
+            count += 1
+        for j in back:
+            if board[j] != id:
+                break
+            count += 1
+        if count >= WIN_LENGTH:
+            return True
+    return False
+
+# Play random moves on an array board until the game ends.
+# Returns the ID of the winner, or ID_EMPTY for a tie.
+# * board -> The bytearray of cell IDs. (It is changed.)
+# * empty -> The empty cells. (It is shuffled.)
+# * side  -> The ID of the side to move.
+# * rng   -> The random.Random to use.
+def mcts_playout(board, empty, side, rng):
+    # Playing the empty cells in a random order is a random game.
+    rng.shuffle(empty)
+    for i in empty:
+        board[i] = side
+        if board_wins_at(board, i, side):
+            return side
+        side ^= 1
+    return ID_EMPTY
+
+# Make a search tree root for a position.
+# * board -> The bytearray of cell IDs.
+# * side  -> The ID of the side to move.
+# * rng   -> The random.Random to use.
+def mcts_new_root(board, side, rng):
+    untried = [i for i in range(0, GRID_CELLS) if board[i] == ID_EMPTY]
+    rng.shuffle(untried)
+    return mcts_node(None, None, side ^ 1, untried)
+
+# Grow a search tree with UCT for a while. Each playout picks the
+# most promising moves down the tree, adds one new move, plays the
+# rest of the game randomly, and counts the result back up.
+# At least one playout is always run, however small the budget.
+# Returns the number of playouts.
+# * root   -> The mcts_node of the position.
+# * board  -> The bytearray of cell IDs at the root.
+# * budget -> Seconds to search for.
+# * rng    -> The random.Random to use.
+def mcts_search(root, board, budget, rng):
+    deadline = time.perf_counter() + budget
+    playouts = 0
+    while playouts == 0 or time.perf_counter() < deadline:
+        node = root
+        b = bytearray(board)
+
+        # Select: follow the best children while all their moves are tried.
+        while not node.untried and node.children:
+            log_visits = math.log(node.visits)
+            node = max(node.children, key=lambda c: c.wins / c.visits + MCTS_EXPLORE * math.sqrt(log_visits / c.visits))
+            b[node.move] = node.mover
+
+        # Expand: add one untried move.
+        if node.winner is None and node.untried:
+            side = node.mover ^ 1
+            move = node.untried.pop()
+            b[move] = side
+            untried = [i for i in range(0, GRID_CELLS) if b[i] == ID_EMPTY]
+            winner = None
+            if board_wins_at(b, move, side):
+                winner = side
+            elif not untried:
+                winner = ID_EMPTY
+            rng.shuffle(untried)
+            child = mcts_node(move, node, side, untried, winner)
+            node.children.append(child)
+            node = child
+
+        # Play out the rest of the game.
+        if node.winner is not None:
+            winner = node.winner
+        else:
+            winner = mcts_playout(b, list(node.untried), node.mover ^ 1, rng)
+        playouts += 1
+
+        # Count the result for the side that moved into each node.
+        while node is not None:
+            node.visits += 1
+            if winner == node.mover:
+                node.wins += 1.0
+            elif winner == ID_EMPTY:
+                node.wins += 0.5
+            node = node.parent
+    return playouts
+
+# Search a position in a worker process, for root parallelisation.
+# Returns ({move: visits}, playouts).
+# * grid   -> (GRID_WIDTH, GRID_HEIGHT, WIN_LENGTH).
+# * board  -> The bytes of cell IDs.
+# * side   -> The ID of the side to move.
+# * budget -> Seconds to search for.
+# * seed   -> The seed for this worker.
+def mcts_worker(grid, board, side, budget, seed):
+    if grid != (GRID_WIDTH, GRID_HEIGHT, WIN_LENGTH):
+        grid_setup(*grid)
+    rng = random.Random(seed)
+    board = bytearray(board)
+    root = mcts_new_root(board, side, rng)
+    playouts = mcts_search(root, board, budget, rng)
+    return ({ c.move: c.visits for c in root.children }, playouts)
+
+# Find the node of the current position in the last search tree,
+# if the moves since then are the AI's and the player's moves.
+# * ai_id     -> The ID of the AI.
+# * player_id -> The ID of the player.
+def mcts_reuse(ai_id, player_id):
+    if mcts_root is None:
+        return None
+    old = mcts_root_bits
+    ai_new = grid_bits[ai_id] & ~old[ai_id]
+    player_new = grid_bits[player_id] & ~old[player_id]
+    if grid_bits[ai_id] & old[ai_id] != old[ai_id] or grid_bits[player_id] & old[player_id] != old[player_id]:
+        return None
+    if bb_count(ai_new) != 1 or bb_count(player_new) != 1:
+        return None
+    node = mcts_root
+    for move in (ai_new.bit_length() - 1, player_new.bit_length() - 1):
+        node = next((c for c in node.children if c.move == move), None)
+        if node is None:
+            return None
+    # Let the rest of the old tree go.
+    node.parent = None
+    return node
+
+# Generates a move with Monte Carlo tree search, thinking for
+# mcts_budget seconds, in mcts_jobs processes. A move that wins,
+# or blocks a win, straight away is always taken without searching. The tree is kept
+# for the next move. Some of the time a random move is played
+# instead, so it can be beaten.
+# * ai_id          -> The ID of the AI.
+# * player_id      -> The ID of the player.
+# * mistake_chance -> The chance of playing a random move instead.
+def ai_mcts_move(ai_id, player_id, mistake_chance=0.0):
+    global mcts_root, mcts_root_bits, mcts_pool
+    if random.random() < mistake_chance:
+        return ai_random_move()
+
+    # Don't leave winning, or blocking a win, to chance.
+    forced = ai_forced_move(ai_id, player_id)
+    if forced is not None:
+        mcts_root = None
+        return pos1d_to_2d(forced)
+
+    board = bytearray(grid_vals)
+    root = mcts_reuse(ai_id, player_id)
+    if root is None:
+        root = mcts_new_root(board, ai_id, random)
+
+    # Start the workers, which each grow their own tree from here.
+    futures = []
+    if mcts_jobs > 1:
+        if mcts_pool is None:
+            mcts_pool = ProcessPoolExecutor(mcts_jobs - 1)
+        grid = (GRID_WIDTH, GRID_HEIGHT, WIN_LENGTH)
+        futures = [mcts_pool.submit(mcts_worker, grid, bytes(board), ai_id, mcts_budget, random.getrandbits(64)) for i in range(mcts_jobs - 1)]
+    start = time.perf_counter()
+    playouts = mcts_search(root, board, mcts_budget, random)
+
+    # Add up the visits of each move across every tree.
+    visits = { c.move: c.visits for c in root.children }
+    for future in futures:
+        worker_visits, worker_playouts = future.result()
+        playouts += worker_playouts
+        for move, count in worker_visits.items():
+            visits[move] = visits.get(move, 0) + count
+    seconds = time.perf_counter() - start
+    print("  (Computer ran {} playouts in {:.2f}s, {:.0f}/sec.)".format(playouts, seconds, playouts / seconds if seconds > 0 else 0))
+    if not visits:
+        # Nothing was searched, so fall back to the simple AI.
+        return ai_smart_move(ai_id, player_id)
+
+    mcts_root = root
+    mcts_root_bits = (grid_bits[0], grid_bits[1])
+    return pos1d_to_2d(max(visits, key=visits.get))
+
 # Make the move of the passed ID.
 # Checks for pre-occupation must be done PRIOR 
 # to calling this method!
 def next_move(move_pos, id, player_id, ai_id):
     # Set the ID at the specified point to the ID.
-    grid_vals[move_pos[1] * GRID_WIDTH + move_pos[0]] = id
+    idx = move_pos[1] * GRID_WIDTH + move_pos[0]
+    grid_vals[idx] = id
+    grid_bits[id] |= 1 << idx
 
-    # Check for winner.
-    if find_solution(player_id, grid_vals):
+    # Check for winner. Only the lines through this move can
+    #   have been completed, and only by the one who moved.
+    if id == player_id and bb_wins_at(grid_bits[id], idx):
         global score_player
         draw_grid()
         print("Congratulations, you won.")
         score_player += 1
         return False
-    if find_solution(ai_id, grid_vals):
+    if id == ai_id and bb_wins_at(grid_bits[id], idx):
         global score_ai
         draw_grid()
         print("You lose.")
         score_ai += 1
         return False
     # Check for tie
-    if not ID_EMPTY in grid_vals:
+    if bb_empty(grid_bits) == 0:
         global tie_count
         draw_grid()
         print("You tied with the computer.")
@@ -176,7 +640,15 @@ def next_move(move_pos, id, player_id, ai_id):
 
 # Looks for a solution for the ID's points.
 # If found return value is True, if not - False.
+# This converts the list grid to a bitboard, so it works with
+# any grid, not just grid_vals.
 def find_solution(id, grid):
+    return bb_has_win(grid_to_bits(grid)[id])
+
+# Looks for a solution by scanning the list grid. This is the
+# old way of checking, kept to benchmark the bitboards against.
+# It only finds lines the full width or height of the grid.
+def find_solution_scan(id, grid):
     # ------------------------
     # STRAIGHT-LINE ALGORITHMS:
     # ------------------------
@@ -185,7 +657,7 @@ def find_solution(id, grid):
     for y in range(0, GRID_HEIGHT):
         count = 0
         for x in range(0, GRID_WIDTH):
-            if grid[y * GRID_HEIGHT + x] == id:
+            if grid[y * GRID_WIDTH + x] == id:
                 count += 1
         if count == GRID_WIDTH:
             return True
@@ -194,7 +666,7 @@ def find_solution(id, grid):
     for x in range(0, GRID_WIDTH):
         count = 0
         for y in range(0, GRID_HEIGHT):
-            if grid[y * GRID_HEIGHT + x] == id:
+            if grid[y * GRID_WIDTH + x] == id:
                 count += 1
         if count == GRID_HEIGHT:
             return True
@@ -224,11 +696,160 @@ def find_solution(id, grid):
         
     return False
 
+# Time the list grid against the bitboards for checking wins and
+# finding legal moves, over positions from random games.
+# * count -> The number of positions.
+# * seed  -> The seed for the random games.
+def benchmark(count, seed=0):
+    rng = random.Random(seed)
+    grids = []
+    while len(grids) < count:
+        grid = [ID_EMPTY] * GRID_CELLS
+        order = list(range(GRID_CELLS))
+        rng.shuffle(order)
+        for turn, i in enumerate(order):
+            grid[i] = turn & 1
+            grids.append(list(grid))
+    grids = grids[:count]
+    boards = [grid_to_bits(grid) for grid in grids]
+
+    # Each test is (name, list grid test, bitboard test).
+    tests = [
+        ("win check",
+            lambda: [find_solution_scan(ID_NOUGHTS, g) or find_solution_scan(ID_CROSSES, g) for g in grids],
+            lambda: [bb_has_win(b[0]) or bb_has_win(b[1]) for b in boards]),
+        ("legal moves",
+            lambda: [[i for i in range(GRID_CELLS) if g[i] == ID_EMPTY] for g in grids],
+            lambda: [bb_cells(bb_empty(b)) for b in boards]),
+    ]
+    for name, scan_test, bb_test in tests:
+        times = []
+        for test in (scan_test, bb_test):
+            start = time.perf_counter()
+            test()
+            times.append(time.perf_counter() - start)
+        print("  {:<12} list {:8.0f}ns  bitboard {:8.0f}ns  x{:.1f}".format(
+            name, times[0] / count * 1e9, times[1] / count * 1e9, times[0] / times[1]))
+
+    # Tree search speed from an empty grid, to size its time budget.
+    board = bytearray([ID_EMPTY] * GRID_CELLS)
+    playouts = mcts_search(mcts_new_root(board, ID_CROSSES, rng), board, mcts_budget, rng)
+    print("  {:<12} {:.0f}/sec".format("playouts", playouts / mcts_budget))
+
+# Set the grid size and win length, and make everything that
+# depends on them: the win masks, bitboard tables, symmetries,
+# grid header and an empty grid.
+# * width      -> The number of columns.
+# * height     -> The number of rows.
+# * win_length -> The number in a row needed to win.
+def grid_setup(width, height, win_length):
+    global GRID_WIDTH, GRID_HEIGHT, WIN_LENGTH, GRID_CELLS, GRID_FULL, SCORE_INF
+    global GRID_HEADER, GRID_SEPERATOR, WIN_MASKS, CELL_WIN_MASKS, BB_CELLS_TABLE, SYMMETRIES, CELL_RAYS
+    global grid_vals, sym_tables, tt_table, tt_moves, mcts_root
+    GRID_WIDTH = width
+    GRID_HEIGHT = height
+    WIN_LENGTH = win_length
+    GRID_CELLS = width * height
+    GRID_FULL = (1 << GRID_CELLS) - 1
+    SCORE_INF = GRID_CELLS + 2
+
+    # The header has a column for each number, as wide as the widest.
+    cell_width = len(str(width - 1))
+    GRID_HEADER = "   -" + "".join(" {:>{}} -".format(x, cell_width) for x in range(0, width))
+    GRID_SEPERATOR = "   " + "-" * (1 + (cell_width + 3) * width)
+
+    WIN_MASKS = win_masks_make()
+    CELL_WIN_MASKS = [[m for m in WIN_MASKS if m >> i & 1] for i in range(GRID_CELLS)]
+    BB_CELLS_TABLE = [bb_cells_make(b) for b in range(GRID_FULL + 1)] if GRID_CELLS <= 16 else None
+    SYMMETRIES = symmetries_make()
+    CELL_RAYS = cell_rays_make()
+
+    # Start with an empty grid, and forget any solved positions.
+    grid_vals = [ID_EMPTY] * GRID_CELLS
+    grid_bits[ID_NOUGHTS] = 0
+    grid_bits[ID_CROSSES] = 0
+    sym_tables = None
+    tt_table = {}
+    tt_moves = {}
+    mcts_root = None
+
+# Make the bitboard masks of every winning line: every
+# WIN_LENGTH cells in a row across, down, or diagonally.
+def win_masks_make():
+    masks = []
+    for y in range(0, GRID_HEIGHT):
+        for x in range(0, GRID_WIDTH):
+            for dx, dy in ((1, 0), (0, 1), (1, 1), (-1, 1)):
+                # Skip lines that would run off the grid.
+                end_x = x + dx * (WIN_LENGTH - 1)
+                end_y = y + dy * (WIN_LENGTH - 1)
+                if not 0 <= end_x < GRID_WIDTH or not end_y < GRID_HEIGHT:
+                    continue
+                m = 0
+                for n in range(0, WIN_LENGTH):
+                    m |= 1 << ((y + dy * n) * GRID_WIDTH + x + dx * n)
+                masks.append(m)
+    return masks
+
+# Make the cells out from each cell in the four line directions,
+# both ways, up to WIN_LENGTH - 1 cells or the edge of the grid.
+def cell_rays_make():
+    rays = []
+    for i in range(0, GRID_CELLS):
+        x, y = pos1d_to_2d(i)
+        cell = []
+        for dx, dy in ((1, 0), (0, 1), (1, 1), (-1, 1)):
+            both = []
+            for sign in (1, -1):
+                ray = []
+                for n in range(1, WIN_LENGTH):
+                    rx = x + dx * n * sign
+                    ry = y + dy * n * sign
+                    if not 0 <= rx < GRID_WIDTH or not 0 <= ry < GRID_HEIGHT:
+                        break
+                    ray.append(ry * GRID_WIDTH + rx)
+                both.append(tuple(ray))
+            cell.append(tuple(both))
+        rays.append(tuple(cell))
+    return rays
+
+grid_setup(GRID_WIDTH, GRID_HEIGHT, WIN_LENGTH)
+
 # This is the main function. Gets called
 # when the program is executed.
-def main_func():
+# * args -> The command-line arguments passed into the program 
+def main_func(args):
+    parser = argparse.ArgumentParser(description="A game of Noughts & Crosses.")
+    parser.add_argument("--benchmark", type=int, nargs="?", const=100000, metavar="POSITIONS", help="time the list grid against the bitboards")
+    parser.add_argument("--difficulty", choices=list(AI_MISTAKES), default="hard", help="how often the computer makes a random move")
+    parser.add_argument("--width", type=int, default=GRID_WIDTH, help="number of columns")
+    parser.add_argument("--height", type=int, default=GRID_HEIGHT, help="number of rows (up to 26)")
+    parser.add_argument("-k", "--win-length", type=int, help="number in a row needed to win (default the smaller side)")
+    parser.add_argument("--mcts", action="store_true", help="use tree search even on grids small enough to solve")
+    parser.add_argument("--think", type=float, default=MCTS_BUDGET, metavar="SECONDS", help="seconds the tree search thinks for each move")
+    parser.add_argument("--jobs", type=int, default=1, help="processes the tree search runs in")
+    opts = parser.parse_args(args[1:])
+    win_length = opts.win_length if opts.win_length is not None else min(opts.width, opts.height)
+    if not 1 <= opts.width or not 1 <= opts.height <= GRID_MAX_ROWS:
+        parser.error("the grid must be at least 1x1, with at most {} rows".format(GRID_MAX_ROWS))
+    if not 1 <= win_length <= max(opts.width, opts.height):
+        parser.error("the win length must fit on the grid")
+    if opts.think <= 0:
+        parser.error("--think must be more than 0 seconds")
+    grid_setup(opts.width, opts.height, win_length)
+    global mcts_budget, mcts_jobs
+    mcts_budget = opts.think
+    mcts_jobs = max(1, opts.jobs)
+    ai_move = ai_mcts_move if opts.mcts else ai_perfect_move
+    if opts.benchmark is not None:
+        benchmark(opts.benchmark)
+        return
+
     print("-- -- Noughts & Crosses -- --")
+    if (GRID_WIDTH, GRID_HEIGHT, WIN_LENGTH) != (3, 3, 3):
+        print("  ({}x{}, {} in a row to win.)".format(GRID_WIDTH, GRID_HEIGHT, WIN_LENGTH))
     global grid_vals
+    mistake_chance = AI_MISTAKES[opts.difficulty]
 
     # Number of rounds played.
     round_counter = 0
@@ -244,12 +865,13 @@ def main_func():
         # Reinitialise grid to empty.
         for i in range(GRID_WIDTH * GRID_HEIGHT):
             grid_vals[i] = ID_EMPTY
+        grid_bits[ID_NOUGHTS] = 0
+        grid_bits[ID_CROSSES] = 0
 
         # Choose a player to go first by random.
-        # If computer is chosen, they will pick a random cell.
         first_player = random.choice([ID_NOUGHTS, ID_CROSSES]) 
         if first_player == ai_id :
-            next_move(ai_random_move(), ai_id, player_id, ai_id)
+            next_move(ai_move(ai_id, player_id, mistake_chance), ai_id, player_id, ai_id)
             print("Computer played the first move.")
         else:
             print("You are playing the first move.")
@@ -262,7 +884,10 @@ def main_func():
             # Stupid AI: Picks a random cell.
             # next_move(ai_random_move(), ai_id)
             # Smart AI: Checks for move that will yield a win.
-            if not next_move(ai_smart_move(ai_id, player_id), ai_id, player_id, ai_id):
+            # next_move(ai_smart_move(ai_id, player_id), ai_id)
+            # Perfect AI: Searches the whole game, with some random moves.
+            #   (Or tree search, on grids too big for that.)
+            if not next_move(ai_move(ai_id, player_id, mistake_chance), ai_id, player_id, ai_id):
                 break
 
         tie_str = "\n  Ties: " + str(tie_count) if tie_count > 0 else "" 
@@ -279,4 +904,6 @@ def main_func():
 
         round_counter += 1
 
-main_func()
\ No newline at end of file
+# Call the main method
+if __name__ == "__main__":
+    main_func(sys.argv)